@@ -0,0 +1,31 @@
+"""Make components of this repository importable as custom_components.<name>.
+
+Home Assistant loads them from a custom_components directory, so benchmarks
+import them the same way through a temporary directory holding a
+custom_components symlink to the repository root. The directory is removed
+when the interpreter exits.
+"""
+import atexit
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+_PATH = None
+
+
+def _cleanup(path) -> None:
+    os.unlink(os.path.join(path, 'custom_components'))
+    os.rmdir(path)
+
+
+def custom_components() -> None:
+    """Put custom_components package on sys.path, once per process"""
+    global _PATH
+    if _PATH is not None:
+        return
+    _PATH = tempfile.mkdtemp()
+    os.symlink(ROOT, os.path.join(_PATH, 'custom_components'))
+    atexit.register(_cleanup, _PATH)
+    sys.path.insert(0, _PATH)
@@ -0,0 +1,196 @@
+"""Fleet-scale poll and command benchmark for the Floureon integration.
+
+Runs against thermostats emulated by floureon_emulator on 127.0.0.1, fully
+offline. For every fleet size it reports throughput, p50/p99 operation latency,
+errors and how long the event loop was blocked for:
+
+- BroadlinkThermostat.async_read_status with broadlink and asyncio transports
+- FloureonClimate.async_update and FloureonSwitch.async_turn_on (needs
+  homeassistant installed, skipped otherwise)
+
+An operation counts as an error when it raises or its check fails: status
+read returned nothing, coordinator holds no data after update, or emulated
+thermostat registers do not show the state the switch was turned on to.
+
+    python benchmarks/floureon_bench.py --devices 1,10,100,500 --latency 0.02 --loss 0.01 --dead 0
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import bootstrap
+
+bootstrap.custom_components()
+
+from custom_components.floureon import (  # noqa: E402
+    BroadlinkThermostat,
+    TRANSPORT_ASYNCIO,
+    TRANSPORT_BROADLINK
+)
+from floureon_emulator import async_start_fleet, device_mac  # noqa: E402
+
+PROBE_INTERVAL = 0.005
+
+
+class LoopProbe:
+    """Measure how long the event loop was blocked"""
+
+    def __init__(self):
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(PROBE_INTERVAL)
+            self.lags.append(max(0.0, time.monotonic() - started - PROBE_INTERVAL))
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    @property
+    def blocked(self) -> float:
+        return sum(lag for lag in self.lags if lag > PROBE_INTERVAL)
+
+    @property
+    def max_lag(self) -> float:
+        return max(self.lags or [0.0])
+
+
+def percentile(values, fraction) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def measure(operations, rounds):
+    """Run (operation, check) pairs concurrently for given rounds, return latencies, errors, wall time and probe
+
+    check gets result of operation and returns True if it succeeded.
+    """
+    latencies = []
+    errors = 0
+
+    async def timed(operation, check):
+        nonlocal errors
+        started = time.monotonic()
+        try:
+            succeeded = check(await operation())
+        except Exception:
+            succeeded = False
+        latencies.append(time.monotonic() - started)
+        if not succeeded:
+            errors += 1
+
+    with LoopProbe() as probe:
+        started = time.monotonic()
+        for _ in range(rounds):
+            await asyncio.gather(*[timed(operation, check) for operation, check in operations])
+        wall = time.monotonic() - started
+
+    return latencies, errors, wall, probe
+
+
+def report(name, devices, latencies, errors, wall, probe):
+    print("{0:<28} {1:>5} {2:>9.1f} {3:>9.1f} {4:>9.1f} {5:>7} {6:>10.1f} {7:>9.1f}".format(
+        name, devices, len(latencies) / wall if wall else 0.0,
+        statistics.median(latencies) * 1000 if latencies else 0.0,
+        percentile(latencies, 0.99) * 1000, errors, probe.blocked * 1000, probe.max_lag * 1000))
+
+
+def thermostats(fleet, prefix, transport, timeout):
+    return [
+        BroadlinkThermostat('127.0.0.1', device_mac(i, prefix), port=emulator.port,
+                            timeout=timeout, transport=transport)
+        for i, emulator in enumerate(fleet)
+    ]
+
+
+async def bench_thermostat(fleet, prefix, args):
+    for offset, transport in enumerate([TRANSPORT_BROADLINK, TRANSPORT_ASYNCIO]):
+        devices = thermostats(fleet, prefix + offset, transport, args.timeout)
+        result = await measure([
+            (device.async_read_status, lambda data: data is not None) for device in devices
+        ], args.rounds)
+        report('read_status ({0})'.format(transport), len(fleet), *result)
+
+
+async def bench_entities(fleet, prefix, args):
+    try:
+        from homeassistant.core import HomeAssistant
+        from custom_components.floureon.climate import FloureonClimate
+        from custom_components.floureon.coordinator import DEFAULT_SCAN_INTERVAL, ThermostatCoordinator
+        from custom_components.floureon.switch import FloureonSwitch
+    except ImportError as e:
+        print("{0:<28} skipped: {1}".format('entities', str(e)))
+        return
+
+    def updated(entity, emulator):
+        return lambda _: entity._coordinator.data is not None
+
+    def turned_on(entity, emulator):
+        # Setpoint register holds half degrees
+        return lambda _: emulator.registers[1] & 0x01 and emulator.registers[3] == int(entity._max_temp * 2)
+
+    hass = HomeAssistant()
+    for offset, (platform, entity_class, operation, check) in enumerate([
+        ('climate', FloureonClimate, 'async_update', updated),
+        ('switch', FloureonSwitch, 'async_turn_on', turned_on),
+    ]):
+        operations = []
+        for i, emulator in enumerate(fleet):
+            config = {
+                'host': '127.0.0.1',
+                'mac': device_mac(i, prefix + offset),
+                'name': 'bench_{0}'.format(i),
+                'schedule': 0,
+                'use_external_temp': True,
+                'turn_on_mode': 'max_temp',
+                'turn_off_mode': 'min_temp',
+                'transport': args.transport,
+            }
+            thermostat = BroadlinkThermostat('127.0.0.1', config['mac'], port=emulator.port,
+                                             timeout=args.timeout, transport=args.transport)
+            coordinator = ThermostatCoordinator(hass, thermostat, DEFAULT_SCAN_INTERVAL, config['mac'])
+            entity = entity_class(config, coordinator)
+            entity.hass = hass
+            entity.entity_id = '{0}.bench_{1}'.format(platform, i)
+            operations.append((getattr(entity, operation), check(entity, emulator)))
+
+        result = await measure(operations, args.rounds)
+        report('{0}.{1}'.format(entity_class.__name__, operation), len(fleet), *result)
+
+
+async def run(args):
+    print("{0:<28} {1:>5} {2:>9} {3:>9} {4:>9} {5:>7} {6:>10} {7:>9}".format(
+        'operation', 'N', 'ops/s', 'p50 ms', 'p99 ms', 'errors', 'blocked ms', 'max lag'))
+
+    for size_index, devices in enumerate(int(n) for n in args.devices.split(',')):
+        fleet = await async_start_fleet(devices, args.latency, args.loss, min(args.dead, devices))
+        prefix = size_index * 4
+        await bench_thermostat(fleet, prefix, args)
+        await bench_entities(fleet, prefix + 2, args)
+        for emulator in fleet:
+            emulator.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', default='1,10,100,500', help="comma separated fleet sizes")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.02, help="emulated device reply latency, seconds")
+    parser.add_argument('--loss', type=float, default=0.0, help="emulated packet loss ratio")
+    parser.add_argument('--dead', type=int, default=0, help="number of devices which never answer")
+    parser.add_argument('--timeout', type=float, default=2, help="thermostat socket timeout, seconds")
+    parser.add_argument('--transport', default=TRANSPORT_BROADLINK, help="transport used by entities")
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""Local UDP emulator of the 0x4EAD Broadlink (Hysen) thermostat.
+
+Speaks enough of the protocol for BroadlinkThermostat: auth handshake, status
+reads (full and short), set_power, set_mode, set_temp, set_time, set_schedule
+and set_advanced. Each emulated device listens on its own UDP port on
+127.0.0.1 and can be given a reply latency, a packet loss ratio, or be dead
+(never answers).
+
+    python benchmarks/floureon_emulator.py --devices 5 --latency 0.02 --loss 0.01
+"""
+import argparse
+import asyncio
+import os
+import random
+
+import broadlink
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+IV = bytes([0x56, 0x2e, 0x17, 0x99, 0x6d, 0x09, 0x3d, 0x28, 0xdd, 0xb3, 0xba, 0x69, 0x5a, 0x2e, 0x6f, 0x58])
+DEFAULT_KEY = bytes([0x09, 0x76, 0x28, 0x34, 0x3f, 0xe9, 0x9e, 0x23, 0x76, 0x5c, 0x15, 0x13, 0xac, 0xcf, 0x8b, 0x02])
+
+# Register bytes as returned after the [0x01, 0x03, length] header of a read, see broadlink.hysen.get_full_status
+REGISTERS = 44
+READ_ONLY = {2, 15}  # room_temp, external_temp
+
+
+def aes(key):
+    return Cipher(algorithms.AES(key), modes.CBC(IV), backend=default_backend())
+
+
+def crc16(data) -> int:
+    return broadlink.hysen.calculate_crc16(None, bytes(data))
+
+
+def device_mac(index, prefix=0x00) -> str:
+    """Return MAC address of emulated device"""
+    return '78:0f:77:{0:02x}:{1:02x}:{2:02x}'.format(prefix, index >> 8, index & 0xff)
+
+
+class ThermostatEmulator(asyncio.DatagramProtocol):
+
+    def __init__(self, latency=0.0, loss=0.0, dead=False, seed=None):
+        self.latency = latency
+        self.loss = loss
+        self.dead = dead
+        self.received = 0
+        self.answered = 0
+
+        self._random = random.Random(seed)
+        self._transport = None
+        self._key = os.urandom(16)
+        self._id = os.urandom(4)
+
+        self.registers = bytearray(REGISTERS)
+        self.registers[1] = 0x01  # power on
+        self.registers[2] = 42  # room temp 21.0
+        self.registers[3] = 44  # setpoint 22.0
+        self.registers[4] = 0x10 | 0x00  # loop mode 0, manual
+        self.registers[5] = 0x00  # internal sensor
+        self.registers[6] = 42  # osv
+        self.registers[7] = 2  # dif
+        self.registers[8] = 35  # svh
+        self.registers[9] = 5  # svl
+        self.registers[15] = 40  # external temp 20.0
+        for i in range(8):
+            self.registers[20 + 2 * i] = 6 + 2 * i
+            self.registers[36 + i] = 40
+
+    @property
+    def port(self) -> int:
+        return self._transport.get_extra_info('sockname')[1]
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def datagram_received(self, data, addr) -> None:
+        self.received += 1
+        if self.dead or len(data) < 0x38 or self._random.random() < self.loss:
+            return
+
+        try:
+            response = self._handle(bytearray(data))
+        except Exception:
+            return
+
+        if self.latency:
+            asyncio.get_event_loop().call_later(self.latency, self._send, response, addr)
+        else:
+            self._send(response, addr)
+
+    def _send(self, response, addr) -> None:
+        if self._transport.is_closing():
+            return
+        self.answered += 1
+        self._transport.sendto(response, addr)
+
+    def _handle(self, packet) -> bytes:
+        command = packet[0x26]
+        if command == 0x65:
+            payload = bytearray(0x20)
+            payload[0x00:0x04] = self._id
+            payload[0x04:0x14] = self._key
+            return self._reply(packet, DEFAULT_KEY, payload)
+
+        decryptor = aes(self._key).decryptor()
+        payload = decryptor.update(bytes(packet[0x38:])) + decryptor.finalize()
+        request = payload[2:payload[0]]
+        return self._reply(packet, self._key, self._modbus(request))
+
+    def _modbus(self, request) -> bytearray:
+        """Handle hysen request, return response payload with length and CRC"""
+        function = request[1]
+        address = request[3]
+        if function == 0x03:
+            count = request[5] * 2
+            response = bytearray([0x01, 0x03, count]) + self.status()[:count]
+        else:
+            if function == 0x06:
+                self._write(address * 2, request[4:6])
+            elif function == 0x10:
+                self._write(address * 2, request[7:7 + request[6]])
+            response = bytearray(request[0:6])
+
+        crc = crc16(response)
+        payload = bytearray([len(response) + 2, 0x00]) + response + bytearray([crc & 0xff, crc >> 8])
+        return payload
+
+    def _write(self, offset, values) -> None:
+        """Write register bytes the same way the thermostat does"""
+        manual = self.registers[4] & 0x0f == 0
+        for i, value in enumerate(values):
+            if offset + i not in READ_ONLY and offset + i < REGISTERS:
+                self.registers[offset + i] = value
+
+        if offset == 2 and not manual:
+            self.registers[1] |= 0x40  # set_temp in auto mode overrides schedule
+        elif offset == 4:
+            self.registers[1] &= ~0x40
+
+    def status(self) -> bytearray:
+        """Return register bytes with heating state"""
+        registers = bytearray(self.registers)
+        heating = registers[1] & 0x01 and registers[2] < registers[3]
+        registers[1] = (registers[1] & ~0x10) | (0x10 if heating else 0)
+        return registers
+
+    def _reply(self, request, key, payload) -> bytes:
+        payload = bytes(payload) + bytes((16 - len(payload)) % 16)
+        encryptor = aes(key).encryptor()
+        packet = bytearray(0x38)
+        packet[0x00:0x08] = request[0x00:0x08]
+        packet[0x24:0x30] = request[0x24:0x30]
+        packet[0x30:0x34] = self._id
+        packet.extend(encryptor.update(payload) + encryptor.finalize())
+        return bytes(packet)
+
+
+async def async_start_fleet(count, latency=0.0, loss=0.0, dead=0, seed=0):
+    """Start count emulated thermostats, the last dead of them never answer"""
+    loop = asyncio.get_event_loop()
+    fleet = []
+    for i in range(count):
+        _, emulator = await loop.create_datagram_endpoint(
+            lambda: ThermostatEmulator(latency, loss, i >= count - dead, seed + i),
+            local_addr=('127.0.0.1', 0))
+        fleet.append(emulator)
+    return fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--dead', type=int, default=0)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    fleet = loop.run_until_complete(async_start_fleet(args.devices, args.latency, args.loss, args.dead))
+    for i, emulator in enumerate(fleet):
+        print("{0} 127.0.0.1:{1}{2}".format(device_mac(i), emulator.port, ' (dead)' if emulator.dead else ''))
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
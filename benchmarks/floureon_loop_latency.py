@@ -0,0 +1,92 @@
+"""Event loop latency with unreachable Floureon thermostats.
+
+Polls N thermostats that never answer (UDP sockets that swallow every packet)
+once with blocking calls made straight from the event loop, and once through
+the async BroadlinkThermostat API, while a probe coroutine measures how late
+the loop wakes up.
+
+    python benchmarks/floureon_loop_latency.py --devices 50 --timeout 1
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import time
+
+import bootstrap
+
+bootstrap.custom_components()
+
+from custom_components.floureon import BroadlinkThermostat  # noqa: E402
+
+PROBE_INTERVAL = 0.01
+
+
+def dead_devices(count):
+    """Bind UDP sockets that never reply"""
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sockets.append(sock)
+    return sockets
+
+
+async def probe(lags, stop):
+    """Measure how late the event loop wakes up"""
+    while not stop.is_set():
+        started = time.monotonic()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.monotonic() - started - PROBE_INTERVAL)
+
+
+async def run(thermostats, blocking):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.ensure_future(probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL)
+
+    started = time.monotonic()
+    if blocking:
+        for thermostat in thermostats:
+            thermostat.thermostat_read_status()
+            await asyncio.sleep(0)
+    else:
+        await asyncio.gather(*[thermostat.async_read_status() for thermostat in thermostats])
+    elapsed = time.monotonic() - started
+
+    stop.set()
+    await probe_task
+    return elapsed, lags
+
+
+def report(name, elapsed, lags):
+    lags = sorted(lags) or [0.0]
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+    print("{0:<10} wall {1:8.2f}s  loop lag median {2:8.1f}ms  p99 {3:8.1f}ms  max {4:8.1f}ms".format(
+        name, elapsed, statistics.median(lags) * 1000, p99 * 1000, lags[-1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=1)
+    args = parser.parse_args()
+
+    sockets = dead_devices(args.devices)
+    thermostats = [
+        BroadlinkThermostat('127.0.0.1', '78:0f:77:00:{0:02x}:{1:02x}'.format(i >> 8, i & 0xff),
+                            port=sock.getsockname()[1], timeout=args.timeout)
+        for i, sock in enumerate(sockets)
+    ]
+
+    loop = asyncio.get_event_loop()
+    for name, blocking in [('blocking', True), ('async', False)]:
+        report(name, *loop.run_until_complete(run(thermostats, blocking)))
+
+    for sock in sockets:
+        sock.close()
+
+
+if __name__ == '__main__':
+    main()
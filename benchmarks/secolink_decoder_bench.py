@@ -0,0 +1,97 @@
+"""Secolink Contact ID decoder micro-benchmark.
+
+Decodes the same mix of CSV IP reports with the original per-message
+re.match / if-elif handler and with the precompiled decoder and transition
+table, and reports messages per second for both.
+
+    python benchmarks/secolink_decoder_bench.py --messages 200000
+"""
+import argparse
+import random
+import re
+import time
+
+import bootstrap
+
+bootstrap.custom_components()
+
+from custom_components.secolink.protocol import EVENT_NAMES, decode  # noqa: E402
+
+QUAL_OPEN = 1
+QUAL_CLOSE = 3
+
+
+def messages(count, seed=0):
+    """Return count reports with random events, areas and zones"""
+    rand = random.Random(seed)
+    codes = sorted(EVENT_NAMES)
+    return [
+        'user,pass,1234,18{0}{1:03d}{2:02d}{3:03d}'.format(
+            rand.choice('136'), rand.choice(codes), rand.randint(0, 99), rand.randint(0, 299)).encode('utf-8')
+        for _ in range(count)
+    ]
+
+
+def original(data):
+    """Original ThreadedTCPRequestHandler.handle parsing, without socket and logging"""
+    data = data.decode('utf-8')
+    match = re.match('^(.*?),(.*?),(\\d{4}),18(\\d)(\\d{3})([A-F0-9]{2})(\\d{3})$', data)
+    if not match:
+        return None
+
+    event_qual = int(match.group(4))
+    event_type = int(match.group(5))
+    event_zone = match.group(7)
+
+    state = None
+    if 100 <= event_type < 200:
+        state = 'triggered'
+    elif 400 <= event_type < 410:
+        if event_qual == QUAL_OPEN:
+            state = 'disarmed'
+        elif event_qual == QUAL_CLOSE:
+            state = 'armed_away'
+    elif event_type == 441 and re.match(r'1\d\d', event_zone):
+        if event_qual == QUAL_OPEN:
+            state = 'disarmed'
+        elif event_qual == QUAL_CLOSE:
+            state = 'armed_home'
+    elif event_type == 441 and re.match(r'2\d\d', event_zone):
+        if event_qual == QUAL_OPEN:
+            state = 'disarmed'
+        elif event_qual == QUAL_CLOSE:
+            state = 'armed_night'
+    return state
+
+
+def table(data):
+    """Precompiled decoder and transition table"""
+    event = decode(data)
+    return event.transition if event is not None else None
+
+
+def measure(decoders, frames, rounds):
+    """Return best messages per second of every decoder, rounds interleaved to even out noise"""
+    best = {}
+    for _ in range(rounds):
+        for name, func in decoders:
+            started = time.perf_counter()
+            for frame in frames:
+                func(frame)
+            best[name] = max(best.get(name, 0.0), len(frames) / (time.perf_counter() - started))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    frames = messages(args.messages)
+    for name, rate in measure([('original', original), ('table', table)], frames, args.rounds).items():
+        print("{0:<10} {1:>12.0f} msg/s".format(name, rate))
+
+
+if __name__ == '__main__':
+    main()
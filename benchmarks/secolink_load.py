@@ -0,0 +1,359 @@
+"""Load generator for Secolink CSV IP receivers.
+
+Fake panels open many concurrent TCP connections to a receiver and send a mix
+of valid, invalid (wrong password or client ID) and malformed reports at a
+controlled total rate. Valid reports must be acknowledged with ACK, anything
+else must not be. For every receiver it reports throughput, p50/p99 ACK
+latency, lost ACKs (valid report not acknowledged within --ack-timeout),
+false ACKs (invalid or malformed report acknowledged), and peak thread count
+and peak memory of the receiver process.
+
+Receivers run in a child process so their threads and memory are measured
+apart from the load generator:
+
+- listener: SecolinkListener, asyncio server used by the integration
+- threaded: original ThreadedTCPServer / ThreadedTCPRequestHandler, one
+  report per connection
+
+Another receiver can be added to RECEIVERS, or an already running one
+(e.g. Home Assistant) loaded with --target host:port.
+
+Panels either connect once per report (--mode oneshot, what the original
+receiver supports) or keep one connection and wait for each ACK before the
+next report (--mode persistent).
+
+    python benchmarks/secolink_load.py --receivers listener,threaded --connections 1,50,200 --rate 2000
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import random
+import re
+import resource
+import socketserver
+import statistics
+import threading
+import time
+
+import bootstrap
+
+bootstrap.custom_components()
+
+from custom_components.secolink.listener import SecolinkListener  # noqa: E402
+
+USERNAME = 'user'
+PASSWORD = 'pass'
+CLIENTID = '1234'
+
+VALID = 'valid'
+INVALID = 'invalid'
+MALFORMED = 'malformed'
+
+# Receiver thread count and memory are sampled this often
+SAMPLE_INTERVAL = 0.01
+
+
+def report(rand, username=USERNAME, password=PASSWORD, clientid=CLIENTID) -> bytes:
+    return '{0},{1},{2},18{3}{4:03d}{5:02d}{6:03d}'.format(
+        username, password, clientid, rand.choice('136'), rand.choice([130, 301, 401, 441, 602]),
+        rand.randint(0, 99), rand.randint(0, 299)).encode('utf-8')
+
+
+def frame(rand, invalid, malformed):
+    """Return kind and bytes of random report"""
+    roll = rand.random()
+    if roll < malformed:
+        return MALFORMED, rand.choice([
+            report(rand)[:-4],  # truncated
+            report(rand).replace(b',18', b',19'),  # not Contact ID
+            b'\xff\xfe' + report(rand)[2:],  # not UTF-8
+            bytes(rand.randint(33, 126) for _ in range(rand.randint(1, 30))),
+        ])
+    if roll < malformed + invalid:
+        if rand.random() < 0.5:
+            return INVALID, report(rand, password='wrong')
+        return INVALID, report(rand, clientid='9999')
+    return VALID, report(rand)
+
+
+class Results:
+
+    def __init__(self):
+        self.sent = {VALID: 0, INVALID: 0, MALFORMED: 0}
+        self.latencies = []
+        self.lost = 0
+        self.false_acks = 0
+        self.connect_errors = 0
+
+    def percentile(self, fraction) -> float:
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def paced(rate, duration, rand):
+    """Yield send times of one panel, evenly spaced with random phase"""
+    interval = 1.0 / rate
+    started = time.monotonic() + rand.random() * interval
+    deadline = started + duration
+    index = 0
+    while True:
+        at = started + index * interval
+        if at >= deadline:
+            return
+        delay = at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield
+        index += 1
+
+
+async def oneshot_panel(host, port, args, rate, rand, results):
+    """Connect, send one report and wait for ACK or close, like the original receiver expects"""
+    async for _ in paced(rate, args.duration, rand):
+        kind, data = frame(rand, args.invalid, args.malformed)
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), args.ack_timeout)
+        except (OSError, asyncio.TimeoutError):
+            results.connect_errors += 1
+            continue
+        results.sent[kind] += 1
+        started = time.monotonic()
+        try:
+            writer.write(data)
+            writer.write_eof()
+            reply = await asyncio.wait_for(reader.read(16), args.ack_timeout)
+            if kind == VALID and reply.startswith(b'ACK'):
+                results.latencies.append(time.monotonic() - started)
+            elif kind == VALID:
+                results.lost += 1
+            elif reply:
+                results.false_acks += 1
+        except (OSError, asyncio.TimeoutError):
+            if kind == VALID:
+                results.lost += 1
+        finally:
+            writer.close()
+
+
+async def persistent_panel(host, port, args, rate, rand, results):
+    """Keep one connection, send delimited reports and wait for ACK of each valid one"""
+    reader = writer = None
+    async for _ in paced(rate, args.duration, rand):
+        if writer is None:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), args.ack_timeout)
+            except (OSError, asyncio.TimeoutError):
+                results.connect_errors += 1
+                continue
+
+        kind, data = frame(rand, args.invalid, args.malformed)
+        results.sent[kind] += 1
+        started = time.monotonic()
+        try:
+            writer.write(data + b'\n')
+            if kind != VALID:
+                continue
+            reply = await asyncio.wait_for(reader.readexactly(3), args.ack_timeout)
+            if reply == b'ACK':
+                results.latencies.append(time.monotonic() - started)
+                continue
+            results.lost += 1
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            if kind == VALID:
+                results.lost += 1
+
+        # ACKs are not correlated, start over on a new connection once stream is out of step
+        writer.close()
+        reader = writer = None
+
+    if writer is not None:
+        # ACK of invalid report would still be unread
+        try:
+            writer.write_eof()
+            rest = await asyncio.wait_for(reader.read(), args.ack_timeout)
+            results.false_acks += rest.count(b'ACK')
+        except (OSError, asyncio.TimeoutError):
+            pass
+        writer.close()
+
+
+async def load(host, port, connections, args):
+    results = Results()
+    panel = oneshot_panel if args.mode == 'oneshot' else persistent_panel
+    rate = args.rate / connections
+    started = time.monotonic()
+    await asyncio.gather(*[
+        panel(host, port, args, rate, random.Random(index), results) for index in range(connections)
+    ])
+    return results, time.monotonic() - started
+
+
+class BenchPanel:
+    """Stand-in for SecolinkAlarm, checks credentials like the entity does"""
+
+    def __init__(self):
+        self.received = 0
+
+    def handle_event(self, event, client_address) -> bool:
+        if event.username != USERNAME or event.password != PASSWORD:
+            return False
+        self.received += 1
+        return True
+
+
+def serve_listener(port, stop):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    listener = SecolinkListener('127.0.0.1', port)
+    listener.register(CLIENTID, BenchPanel())
+    loop.run_until_complete(listener.async_start())
+    yield
+    stopped = asyncio.Event()
+    loop.add_reader(stop.fileno(), stopped.set)
+    loop.run_until_complete(stopped.wait())
+    loop.run_until_complete(listener.async_stop())
+    loop.close()
+
+
+class OriginalHandler(socketserver.BaseRequestHandler):
+    """Original ThreadedTCPRequestHandler.handle parsing and checks, without state updates and logging"""
+
+    def handle(self):
+        data = self.request.recv(32).strip()
+        if not data:
+            return
+        try:
+            data = data.decode('utf-8')
+        except UnicodeDecodeError:
+            return
+        match = re.match('^(.*?),(.*?),(\\d{4}),18(\\d)(\\d{3})([A-F0-9]{2})(\\d{3})$', data)
+        if not match:
+            return
+        if match.group(1) != USERNAME or match.group(2) != PASSWORD or match.group(3) != CLIENTID:
+            return
+        self.request.send('ACK'.encode('utf-8'))
+
+
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def serve_threaded(port, stop):
+    server = ThreadedTCPServer(('127.0.0.1', port), OriginalHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    yield
+    stop.recv()
+    server.shutdown()
+    server.server_close()
+
+
+RECEIVERS = {
+    'listener': serve_listener,
+    'threaded': serve_threaded,
+}
+
+
+def receiver_process(name, port, conn):
+    """Run receiver, report peak threads and memory when parent asks it to stop"""
+    # Every invalid report is logged as warning, keep output readable
+    logging.disable(logging.WARNING)
+    peak = {'threads': 0}
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.wait(SAMPLE_INTERVAL):
+            # Do not count sampler itself
+            peak['threads'] = max(peak['threads'], threading.active_count() - 1)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    serve = RECEIVERS[name](port, conn)
+    next(serve)
+    conn.send('ready')
+    next(serve, None)
+
+    sampling.set()
+    sampler.join()
+    conn.send({
+        'threads': peak['threads'],
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def start_receiver(name, port):
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=receiver_process, args=(name, port, child), daemon=True)
+    process.start()
+    if not parent.poll(10) or parent.recv() != 'ready':
+        raise RuntimeError("Receiver {0} did not start".format(name))
+    return process, parent
+
+
+def stop_receiver(process, conn) -> dict:
+    conn.send('stop')
+    stats = conn.recv() if conn.poll(10) else {}
+    process.join(5)
+    return stats
+
+
+def print_header():
+    print("{0:<10} {1:<10} {2:>5} {3:>8} {4:>8} {5:>9} {6:>8} {7:>8} {8:>6} {9:>6} {10:>7} {11:>8}".format(
+        'receiver', 'mode', 'conns', 'sent', 'acked', 'ack/s', 'p50 ms', 'p99 ms',
+        'lost', 'false', 'threads', 'rss MB'))
+
+
+def print_row(name, connections, args, results, wall, stats):
+    print("{0:<10} {1:<10} {2:>5} {3:>8} {4:>8} {5:>9.1f} {6:>8.2f} {7:>8.2f} {8:>6} {9:>6} {10:>7} {11:>8}".format(
+        name, args.mode, connections, sum(results.sent.values()), len(results.latencies),
+        len(results.latencies) / wall if wall else 0.0,
+        statistics.median(results.latencies) * 1000 if results.latencies else 0.0,
+        results.percentile(0.99) * 1000, results.lost, results.false_acks,
+        stats.get('threads', '-'), '{0:.1f}'.format(stats['rss']) if 'rss' in stats else '-'))
+    if results.connect_errors:
+        print("{0:<10} {1} connection attempts failed".format('', results.connect_errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--receivers', default='listener,threaded', help="comma separated, see RECEIVERS")
+    parser.add_argument('--target', help="host:port of already running receiver instead of --receivers")
+    parser.add_argument('--connections', default='1,50,200', help="comma separated concurrent panel counts")
+    parser.add_argument('--mode', choices=['oneshot', 'persistent'], default='oneshot')
+    parser.add_argument('--rate', type=float, default=1000, help="total reports per second")
+    parser.add_argument('--duration', type=float, default=5, help="seconds of load per run")
+    parser.add_argument('--invalid', type=float, default=0.05, help="ratio of reports with wrong credentials")
+    parser.add_argument('--malformed', type=float, default=0.05, help="ratio of malformed reports")
+    parser.add_argument('--ack-timeout', type=float, default=2, help="seconds to wait for ACK")
+    parser.add_argument('--port', type=int, default=18125)
+    args = parser.parse_args()
+
+    # Every panel connection needs a file descriptor
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    loop = asyncio.get_event_loop()
+    print_header()
+    for connections in (int(n) for n in args.connections.split(',')):
+        if args.target:
+            host, port = args.target.rsplit(':', 1)
+            results, wall = loop.run_until_complete(load(host, int(port), connections, args))
+            print_row(args.target, connections, args, results, wall, {})
+            continue
+
+        for name in args.receivers.split(','):
+            process, conn = start_receiver(name, args.port)
+            try:
+                results, wall = loop.run_until_complete(load('127.0.0.1', args.port, connections, args))
+            finally:
+                stats = stop_receiver(process, conn)
+            print_row(name, connections, args, results, wall, stats)
+
+
+if __name__ == '__main__':
+    main()
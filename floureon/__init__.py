@@ -1,7 +1,9 @@
-import broadlink
+import asyncio
 import logging
 from datetime import datetime
-from socket import timeout
+
+from .session import SESSION_TIMEOUT_ERRORS, get_executor, get_session
+from .stats import DeviceStats
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,49 +19,280 @@ BROADLINK_SENSOR_BOTH = 2
 BROADLINK_TEMP_AUTO = 0
 BROADLINK_TEMP_MANUAL = 1
 
+DOMAIN = 'floureon'
+
 CONF_HOST = 'host'
 CONF_MAC = 'mac'
 CONF_USE_EXTERNAL_TEMP = 'use_external_temp'
 CONF_SCHEDULE = 'schedule'
+CONF_TRANSPORT = 'transport'
+CONF_HEARTBEAT = 'heartbeat'
+
+TRANSPORT_BROADLINK = 'broadlink'
+TRANSPORT_ASYNCIO = 'asyncio'
 
 DEFAULT_SCHEDULE = 0
 DEFAULT_USE_EXTERNAL_TEMP = True
+DEFAULT_PORT = 80
+DEFAULT_TIMEOUT = 10
+DEFAULT_TRANSPORT = TRANSPORT_BROADLINK
+
 
 class BroadlinkThermostat:
 
-    def __init__(self, host, mac):
+    def __init__(self, host, mac, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, transport=DEFAULT_TRANSPORT):
         self._host = host
-        self._port = 80
+        self._port = port
         self._mac = bytes.fromhex(''.join(reversed(mac.split(':'))))
+        self._session = get_session(self._host, self._port, self._mac, timeout, transport)
 
-    def device(self):
-        return broadlink.gendevice(0x4EAD, (self._host, self._port), self._mac)
+    @property
+    def session_reused(self) -> int:
+        """Return how many times cached session was reused"""
+        return self._session.stats.session_reused
+
+    @property
+    def session_established(self) -> int:
+        """Return how many times session was (re-)established"""
+        return self._session.stats.session_established
+
+    @property
+    def breaker_state(self) -> str:
+        """Return circuit breaker state"""
+        return self._session.breaker.state
+
+    @property
+    def failure_count(self) -> int:
+        """Return consecutive failed requests"""
+        return self._session.breaker.failures
+
+    @property
+    def total_failures(self) -> int:
+        """Return all failed requests"""
+        return self._session.breaker.total_failures
+
+    @property
+    def stats(self) -> DeviceStats:
+        """Return latency and error counters of this thermostat"""
+        return self._session.stats
+
+    def _write_commands(self, power=None, auto_mode=None, loop_mode=None, sensor=None, temp=None) -> list:
+        """Return commands which differ from last known status, with status they result in"""
+        status = self._session.get_status()
+        commands = []
+
+        if power is not None and (status is None or status['power'] != power):
+            commands.append(('set_power', (power,), {'power': power}))
+
+        if auto_mode is not None:
+            loop_mode = loop_mode if loop_mode is not None else 0
+            sensor = sensor if sensor is not None else BROADLINK_SENSOR_INTERNAL
+            # Device reports loop mode shifted by one, see broadlink.hysen.set_mode
+            if status is None \
+                    or status['auto_mode'] != auto_mode \
+                    or status['loop_mode'] != loop_mode + 1 \
+                    or status['sensor'] != sensor \
+                    or (auto_mode == BROADLINK_MODE_AUTO and status['temp_manual'] == BROADLINK_TEMP_MANUAL):
+                fields = {'auto_mode': auto_mode, 'loop_mode': loop_mode + 1, 'sensor': sensor,
+                          'temp_manual': BROADLINK_TEMP_AUTO}
+                commands.append(('set_mode', (auto_mode, loop_mode, sensor), fields))
+                if status is not None:
+                    status.update(fields)
+
+        if temp is not None and (status is None or int(status['thermostat_temp'] * 2) != int(temp * 2)):
+            fields = {'thermostat_temp': int(temp * 2) / 2.0}
+            if status is not None and status['auto_mode'] == BROADLINK_MODE_AUTO:
+                fields['temp_manual'] = BROADLINK_TEMP_MANUAL
+            commands.append(('set_temp', (temp,), fields))
+
+        return commands
+
+    def _command(self, name, commands) -> bool:
+        """Run commands on thermostat, return True on success"""
+        if not commands:
+            return True
+        if not self._session.breaker.allow():
+            _LOGGER.debug("Thermostat %s is unreachable, skipping %s", self._host, name)
+            return False
+
+        try:
+            for method, args, fields in commands:
+                self._session.execute(method, *args)
+                self._session.update_status(**fields)
+            self._session.breaker.success()
+            return True
+        except SESSION_TIMEOUT_ERRORS:
+            _LOGGER.debug("Thermostat %s %s timed out", self._host, name)
+            self._session.breaker.failure()
+        except Exception as e:
+            self._session.breaker.release()
+            _LOGGER.error("Thermostat %s %s error: %s", self._host, name, str(e))
+        return False
+
+    async def _async_command(self, name, commands) -> bool:
+        """Run commands on thermostat without blocking event loop, return True on success"""
+        if not commands:
+            return True
+        if self._session.transport != TRANSPORT_ASYNCIO:
+            if self._session.breaker.is_open:
+                return False
+            return await self._async_run(self._command, name, commands)
+        if not self._session.breaker.allow():
+            _LOGGER.debug("Thermostat %s is unreachable, skipping %s", self._host, name)
+            return False
 
-    def thermostat_set_time(self):
-        """Set thermostat time"""
         try:
-            device = self.device()
-            if device.auth():
-                now = datetime.now()
-                device.set_time(now.hour,
-                                now.minute,
-                                now.second,
-                                now.weekday() + 1)
-        except timeout:
-            pass
+            for method, args, fields in commands:
+                await self._session.async_execute(method, *args)
+                self._session.update_status(**fields)
+            self._session.breaker.success()
+            return True
+        except SESSION_TIMEOUT_ERRORS:
+            _LOGGER.debug("Thermostat %s %s timed out", self._host, name)
+            self._session.breaker.failure()
         except Exception as e:
-            _LOGGER.error("Thermostat %s set_time error: %s", self._host, str(e))
+            self._session.breaker.release()
+            _LOGGER.error("Thermostat %s %s error: %s", self._host, name, str(e))
+        return False
+
+    @staticmethod
+    def _set_time_commands() -> list:
+        """Return command setting thermostat clock to local time"""
+        now = datetime.now()
+        return [('set_time', (now.hour, now.minute, now.second, now.weekday() + 1), {})]
+
+    @staticmethod
+    def _mode_changed(previous, data) -> bool:
+        """Return True if thermostat switched between auto and manual mode or schedule loop"""
+        return previous is not None and (previous['auto_mode'] != data['auto_mode']
+                                         or previous['loop_mode'] != data['loop_mode'])
 
-    def thermostat_read_status(self):
-        """Read thermostat data"""
+    def _with_schedule(self, data):
+        """Add cached schedule to status"""
+        if data is not None and 'weekday' not in data and self._session.schedule is not None:
+            data.update(self._session.schedule)
+        return data
+
+    def _read(self, method):
+        """Read thermostat data with given device method"""
         data = None
+        if not self._session.breaker.allow():
+            return data
+
         try:
-            device = self.device()
-            if device.auth():
-                data = device.get_full_status()
-        except timeout:
-            pass
+            writes = self._session.writes
+            data = self._session.execute(method)
+            self._session.set_status(data, writes)
+            self._session.breaker.success()
+        except SESSION_TIMEOUT_ERRORS:
+            _LOGGER.debug("Thermostat %s %s timed out", self._host, method)
+            self._session.breaker.failure()
         except Exception as e:
+            self._session.breaker.release()
             _LOGGER.warning("Thermostat %s read_status error: %s", self._host, str(e))
         finally:
             return data
+
+    def thermostat_read_status(self, full=False):
+        """Read thermostat data, schedule is read only when requested or mode changed and taken from cache otherwise"""
+        if full:
+            return self._read('get_full_status')
+
+        previous = self._session.get_status()
+        data = self._read('get_status')
+        if data is not None and self._session.schedule is not None and self._mode_changed(previous, data):
+            data = self._read('get_full_status') or data
+        return self._with_schedule(data)
+
+    @staticmethod
+    def _schedule(weekday, weekend) -> dict:
+        """Return schedule in the form read from thermostat"""
+        return {
+            key: [{'start_hour': int(period['start_hour']), 'start_minute': int(period['start_minute']),
+                   'temp': int(period['temp'] * 2) / 2.0} for period in periods]
+            for key, periods in [('weekday', weekday), ('weekend', weekend)]
+        }
+
+    def _schedule_commands(self, schedule) -> list:
+        """Return single schedule write unless cached schedule already matches"""
+        if self._session.schedule == schedule:
+            return []
+        return [('set_schedule', (schedule['weekday'], schedule['weekend']), {})]
+
+    async def _async_run(self, func, *args):
+        """Run blocking thermostat call in integration executor"""
+        return await asyncio.get_event_loop().run_in_executor(get_executor(), func, *args)
+
+    async def async_set_time(self) -> bool:
+        """Set thermostat time"""
+        return await asyncio.shield(self._session.queue.write('set_time', self._async_set_time))
+
+    async def _async_set_time(self, fields) -> bool:
+        return await self._async_command('set_time', self._set_time_commands())
+
+    async def async_write(self, **fields) -> bool:
+        """Set thermostat power, mode and temperature, merged with writes still waiting in queue"""
+        fields = {key: value for key, value in fields.items() if value is not None}
+        return await asyncio.shield(self._session.queue.write('write', self._async_write, **fields))
+
+    async def _async_write(self, fields) -> bool:
+        """Send merged writes which differ from last known status"""
+        return await self._async_command('write', self._write_commands(**fields))
+
+    async def _async_read(self, method):
+        """Read thermostat data with given device method over shared UDP transport"""
+        data = None
+        if not self._session.breaker.allow():
+            return data
+
+        try:
+            writes = self._session.writes
+            data = await self._session.async_execute(method)
+            self._session.set_status(data, writes)
+            self._session.breaker.success()
+        except SESSION_TIMEOUT_ERRORS:
+            _LOGGER.debug("Thermostat %s %s timed out", self._host, method)
+            self._session.breaker.failure()
+        except Exception as e:
+            self._session.breaker.release()
+            _LOGGER.warning("Thermostat %s read_status error: %s", self._host, str(e))
+        return data
+
+    async def async_read_status(self, full=False):
+        """Read thermostat data after queued writes, or join read already queued"""
+        return await asyncio.shield(self._session.queue.read(self._async_read_status, full))
+
+    async def _async_read_status(self, full):
+        """Read thermostat data, see thermostat_read_status"""
+        if self._session.transport != TRANSPORT_ASYNCIO:
+            if self._session.breaker.is_open:
+                return None
+            return await self._async_run(self.thermostat_read_status, full)
+
+        if full:
+            return await self._async_read('get_full_status')
+
+        previous = self._session.get_status()
+        data = await self._async_read('get_status')
+        if data is not None and self._session.schedule is not None and self._mode_changed(previous, data):
+            data = await self._async_read('get_full_status') or data
+        return self._with_schedule(data)
+
+    async def async_read_schedule(self):
+        """Read thermostat weekday and weekend schedule"""
+        data = await self.async_read_status(full=True)
+        return self._session.schedule if data is not None else None
+
+    async def async_set_schedule(self, weekday, weekend) -> bool:
+        """Set weekday (6 periods) and weekend (2 periods) schedule, skipped if thermostat already has it"""
+        if self._session.schedule is None and await self.async_read_schedule() is None:
+            return False
+
+        schedule = self._schedule(weekday, weekend)
+        return await asyncio.shield(self._session.queue.write('set_schedule', self._async_set_schedule, **schedule))
+
+    async def _async_set_schedule(self, schedule) -> bool:
+        if not await self._async_command('set_schedule', self._schedule_commands(schedule)):
+            return False
+        self._session.schedule = schedule
+        return True
@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+# Consecutive timeouts after which requests to thermostat fail fast
+BREAKER_FAILURE_THRESHOLD = 3
+# Time before first probe of unreachable thermostat, doubled after each failed probe
+BREAKER_BACKOFF = 30
+BREAKER_MAX_BACKOFF = 1800
+
+
+class CircuitBreaker:
+
+    def __init__(self, host):
+        self._host = host
+        self._lock = threading.Lock()
+        self._state = BREAKER_CLOSED
+        self._backoff = BREAKER_BACKOFF
+        self._retry_at = None
+        self._probing = False
+
+        self.failures = 0
+        self.total_failures = 0
+
+    @property
+    def state(self) -> str:
+        """Return breaker state, open breaker becomes half open once backoff has passed"""
+        if self._state == BREAKER_OPEN and time.monotonic() >= self._retry_at:
+            return BREAKER_HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Return True while requests should fail fast"""
+        return self.state == BREAKER_OPEN
+
+    def allow(self) -> bool:
+        """Return True if request may be sent, only a single probe is let through when half open"""
+        with self._lock:
+            state = self.state
+            if state == BREAKER_CLOSED:
+                return True
+            if state == BREAKER_HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        """Thermostat answered, close breaker"""
+        with self._lock:
+            if self._state != BREAKER_CLOSED:
+                _LOGGER.info("Thermostat %s is reachable again", self._host)
+            self._state = BREAKER_CLOSED
+            self._backoff = BREAKER_BACKOFF
+            self._probing = False
+            self.failures = 0
+
+    def release(self) -> None:
+        """Request ended without telling whether thermostat is reachable, let next probe through"""
+        with self._lock:
+            self._probing = False
+
+    def failure(self) -> None:
+        """Thermostat did not answer, open breaker after too many failures or failed probe"""
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+
+            if self._probing:
+                self._backoff = min(self._backoff * 2, BREAKER_MAX_BACKOFF)
+            elif self.failures < BREAKER_FAILURE_THRESHOLD:
+                return
+
+            if self._state == BREAKER_CLOSED:
+                _LOGGER.warning("Thermostat %s is unreachable, retrying in %d seconds", self._host, self._backoff)
+            self._state = BREAKER_OPEN
+            self._retry_at = time.monotonic() + self._backoff
+            self._probing = False
@@ -1,17 +1,23 @@
+import asyncio
 import logging
-from socket import timeout
+from functools import partial
 from typing import List, Optional
 
 import voluptuous as vol
 
 from custom_components.floureon import (
-    BroadlinkThermostat,
+    DOMAIN,
+    CONF_HEARTBEAT,
     CONF_HOST,
     CONF_MAC,
+    CONF_TRANSPORT,
     CONF_USE_EXTERNAL_TEMP,
     CONF_SCHEDULE,
     DEFAULT_SCHEDULE,
     DEFAULT_USE_EXTERNAL_TEMP,
+    DEFAULT_TRANSPORT,
+    TRANSPORT_BROADLINK,
+    TRANSPORT_ASYNCIO,
     BROADLINK_ACTIVE,
     BROADLINK_IDLE,
     BROADLINK_POWER_ON,
@@ -23,11 +29,16 @@ from custom_components.floureon import (
     BROADLINK_TEMP_AUTO,
     BROADLINK_TEMP_MANUAL
 )
+from custom_components.floureon.coordinator import StateChangeFilter, async_get_coordinator
 
 from homeassistant.components.climate import ClimateEntity, PLATFORM_SCHEMA
+from homeassistant.core import callback
 from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.util import dt as dt_util
 from homeassistant.util.temperature import convert as convert_temperature
 from homeassistant.components.climate.const import (
+    ATTR_HVAC_MODE,
+    ATTR_PRESET_MODE,
     HVAC_MODE_OFF,
     HVAC_MODE_HEAT,
     HVAC_MODE_AUTO,
@@ -44,6 +55,7 @@ from homeassistant.components.climate.const import (
 
 from homeassistant.const import (
     PRECISION_HALVES,
+    ATTR_ENTITY_ID,
     ATTR_TEMPERATURE,
     PRECISION_HALVES,
     TEMP_CELSIUS,
@@ -60,18 +72,108 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Required(CONF_NAME): cv.string,
     vol.Optional(CONF_SCHEDULE, default=DEFAULT_SCHEDULE): vol.All(int, vol.Range(min=0,max=2)),
     vol.Optional(CONF_USE_EXTERNAL_TEMP, default=DEFAULT_USE_EXTERNAL_TEMP): cv.boolean,
+    vol.Optional(CONF_TRANSPORT, default=DEFAULT_TRANSPORT): vol.In([TRANSPORT_BROADLINK, TRANSPORT_ASYNCIO]),
+    vol.Optional(CONF_HEARTBEAT): cv.time_period,
+})
+
+
+DATA_CLIMATE = 'floureon_climate'
+
+# Computed over a sliding window, they drift on every poll and only ride along with other changes
+SLIDING_ATTRIBUTES = ('temp_rate', 'duty_cycle')
+
+SERVICE_SET_ZONE = 'set_zone'
+EVENT_ZONE_RESULT = 'floureon_zone_result'
+SERVICE_SET_SCHEDULE = 'set_schedule'
+EVENT_SCHEDULE_RESULT = 'floureon_schedule_result'
+ATTR_WEEKDAY = 'weekday'
+ATTR_WEEKEND = 'weekend'
+# Thermostats commanded at the same time by set_zone and set_schedule
+ZONE_CONCURRENCY = 10
+
+SET_ZONE_SCHEMA = vol.All(vol.Schema({
+    vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Optional(ATTR_HVAC_MODE): vol.In([HVAC_MODE_AUTO, HVAC_MODE_HEAT, HVAC_MODE_OFF]),
+    vol.Optional(ATTR_PRESET_MODE): vol.In([PRESET_NONE, PRESET_AWAY]),
+    vol.Optional(ATTR_TEMPERATURE): vol.Coerce(float),
+}), cv.has_at_least_one_key(ATTR_HVAC_MODE, ATTR_PRESET_MODE, ATTR_TEMPERATURE))
+
+SCHEDULE_PERIOD_SCHEMA = vol.Schema({
+    vol.Required('start_hour'): vol.All(vol.Coerce(int), vol.Range(min=0, max=23)),
+    vol.Required('start_minute'): vol.All(vol.Coerce(int), vol.Range(min=0, max=59)),
+    vol.Required('temp'): vol.All(vol.Coerce(float), vol.Range(min=DEFAULT_MIN_TEMP, max=DEFAULT_MAX_TEMP)),
+})
+
+SET_SCHEDULE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Required(ATTR_WEEKDAY): vol.All(cv.ensure_list, [SCHEDULE_PERIOD_SCHEMA], vol.Length(min=6, max=6)),
+    vol.Required(ATTR_WEEKEND): vol.All(cv.ensure_list, [SCHEDULE_PERIOD_SCHEMA], vol.Length(min=2, max=2)),
 })
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the generic thermostat platform."""
-    async_add_entities([FloureonClimate(config)])
+    async_add_entities([FloureonClimate(config, async_get_coordinator(hass, config))])
+
+    if not hass.services.has_service(DOMAIN, SERVICE_SET_ZONE):
+        hass.services.async_register(DOMAIN, SERVICE_SET_ZONE, partial(async_set_zone, hass), schema=SET_ZONE_SCHEMA)
+        hass.services.async_register(DOMAIN, SERVICE_SET_SCHEDULE, partial(async_set_schedule, hass),
+                                     schema=SET_SCHEDULE_SCHEMA)
+
+
+async def async_scatter(hass, entity_ids, command, event) -> None:
+    """Run command(entity) for up to ZONE_CONCURRENCY thermostats at once, fire event with per thermostat results"""
+    entities = hass.data.get(DATA_CLIMATE, {})
+    semaphore = asyncio.Semaphore(ZONE_CONCURRENCY)
+
+    async def async_apply(entity_id) -> bool:
+        entity = entities.get(entity_id)
+        if entity is None:
+            _LOGGER.warning("%s is not a Floureon thermostat", entity_id)
+            return False
+        async with semaphore:
+            return await command(entity)
+
+    results = dict(zip(entity_ids, await asyncio.gather(*[async_apply(entity_id) for entity_id in entity_ids])))
+    failed = [entity_id for entity_id, success in results.items() if not success]
+    if failed:
+        _LOGGER.warning("%s failed for %s", event, ', '.join(failed))
+
+    hass.bus.async_fire(event, {
+        'results': results,
+        'succeeded': len(results) - len(failed),
+        'failed': failed
+    })
+
+
+async def async_set_zone(hass, call) -> None:
+    """Apply HVAC mode, preset and / or temperature to many thermostats at once"""
+    async def async_command(entity) -> bool:
+        success = True
+        if ATTR_HVAC_MODE in call.data:
+            success = await entity.async_set_hvac_mode(call.data[ATTR_HVAC_MODE]) and success
+        if ATTR_PRESET_MODE in call.data:
+            success = await entity.async_set_preset_mode(call.data[ATTR_PRESET_MODE]) and success
+        if ATTR_TEMPERATURE in call.data:
+            success = await entity.async_set_temperature(temperature=call.data[ATTR_TEMPERATURE]) and success
+        return success
+
+    await async_scatter(hass, call.data[ATTR_ENTITY_ID], async_command, EVENT_ZONE_RESULT)
+
+
+async def async_set_schedule(hass, call) -> None:
+    """Program weekly schedule of many thermostats at once, writing only those which differ"""
+    async def async_command(entity) -> bool:
+        return await entity.async_set_schedule(call.data[ATTR_WEEKDAY], call.data[ATTR_WEEKEND])
+
+    await async_scatter(hass, call.data[ATTR_ENTITY_ID], async_command, EVENT_SCHEDULE_RESULT)
 
 
 class FloureonClimate(ClimateEntity, RestoreEntity):
 
-    def __init__(self, config):
-        self._thermostat = BroadlinkThermostat(config.get(CONF_HOST), config.get(CONF_MAC))
+    def __init__(self, config, coordinator):
+        self._coordinator = coordinator
+        self._thermostat = coordinator.thermostat
 
         self._name = config.get(CONF_NAME)
         self._use_external_temp = config.get(CONF_USE_EXTERNAL_TEMP)
@@ -92,6 +194,9 @@ class FloureonClimate(ClimateEntity, RestoreEntity):
         self._thermostat_current_temp = None
         self._thermostat_target_temp = None
 
+        self._attributes = {}
+        self._state_filter = StateChangeFilter(config.get(CONF_HEARTBEAT))
+
     def thermostat_get_sensor(self) -> int:
         """Get sensor to use"""
         return BROADLINK_SENSOR_EXTERNAL if self._use_external_temp is True else BROADLINK_SENSOR_INTERNAL
@@ -101,6 +206,16 @@ class FloureonClimate(ClimateEntity, RestoreEntity):
         """Return thermostat name"""
         return self._name
 
+    @property
+    def should_poll(self) -> bool:
+        """Status is pushed by coordinator"""
+        return False
+
+    @property
+    def available(self) -> bool:
+        """Pending until coordinator has read first status"""
+        return self._coordinator.started
+
     @property
     def precision(self) -> float:
         """Return the precision of the system."""
@@ -176,21 +291,55 @@ class FloureonClimate(ClimateEntity, RestoreEntity):
     @property
     def device_state_attributes(self) -> dict:
         """Return the attribute(s) of the sensor"""
-        return {
+        return self._attributes
+
+    def _update_attributes(self) -> None:
+        """Rebuild attributes, keep cached dict if none changed"""
+        attributes = {
             'away_setpoint': self._away_setpoint,
             'manual_setpoint': self._manual_setpoint,
             'external_temp': self._external_temp,
             'room_temp': self._room_temp,
-            'loop_mode': self._thermostat_loop_mode
+            'loop_mode': self._thermostat_loop_mode,
+            'breaker_state': self._thermostat.breaker_state,
+            'failures': self._thermostat.failure_count
         }
+        attributes.update(self._telemetry_attributes())
+        if attributes != self._attributes:
+            self._attributes = attributes
+
+    def _telemetry_attributes(self) -> dict:
+        """Return heating rate, duty cycle and start of current heating run from recent readings"""
+        telemetry = self._coordinator.telemetry
+        rate = telemetry.rate_of_change(external=self._use_external_temp)
+        duty_cycle = telemetry.duty_cycle()
+        heating_since = telemetry.heating_since()
+        return {
+            'temp_rate': round(rate, 1) if rate is not None else None,
+            'duty_cycle': round(duty_cycle, 2) if duty_cycle is not None else None,
+            'heating_since': dt_util.utc_from_timestamp(heating_since).isoformat() if heating_since else None
+        }
+
+    @staticmethod
+    def _round(temp) -> Optional[float]:
+        """Round temperature to PRECISION_HALVES"""
+        return round(temp * 2) / 2 if temp is not None else None
+
+    @callback
+    def _async_write_state(self) -> None:
+        """Write state only if something visible changed or heartbeat is due"""
+        self._update_attributes()
+        state = (self.available, self.hvac_mode, self.hvac_action, self.preset_mode,
+                 self._round(self.current_temperature), self._round(self.target_temperature),
+                 self._min_temp, self._max_temp,
+                 tuple(item for item in self._attributes.items() if item[0] not in SLIDING_ATTRIBUTES))
+        if self._state_filter.changed(state):
+            self.async_write_ha_state()
 
     async def async_added_to_hass(self) -> None:
         """Run when entity about to added."""
         await super().async_added_to_hass()
 
-        # Set thermostat time
-        self._thermostat.thermostat_set_time()
-
         # Restore
         last_state = await self.async_get_last_state()
 
@@ -199,62 +348,96 @@ class FloureonClimate(ClimateEntity, RestoreEntity):
                 if param in last_state.attributes:
                     setattr(self, '_{0}'.format(param), last_state.attributes[param])
 
-    async def async_set_temperature(self, **kwargs) -> None:
+        self._update_attributes()
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_coordinator_update))
+
+        # Make thermostat reachable by set_zone and set_schedule services
+        entities = self.hass.data.setdefault(DATA_CLIMATE, {})
+        entities[self.entity_id] = self
+        self.async_on_remove(partial(entities.pop, self.entity_id, None))
+
+    async def async_set_temperature(self, **kwargs) -> bool:
         """Set new target temperature."""
+        success = False
         if kwargs.get(ATTR_TEMPERATURE) is not None:
             target_temp = float(kwargs.get(ATTR_TEMPERATURE))
-            try:
-                device = self._thermostat.device()
-                if device.auth():
-                    # device.set_power(BROADLINK_POWER_ON)
-                    device.set_mode(BROADLINK_MODE_MANUAL, self._thermostat_loop_mode, self.thermostat_get_sensor())
-                    device.set_temp(target_temp)
-
-                    # Save temperatures for future use
-                    if self._preset_mode == PRESET_AWAY:
-                        self._away_setpoint = target_temp
-                    elif self._preset_mode == PRESET_NONE:
-                        self._manual_setpoint = target_temp
-            except timeout:
-                pass
-
-        await self.async_update_ha_state()
-
-    async def async_set_hvac_mode(self, hvac_mode) -> None:
+            success = await self._thermostat.async_write(auto_mode=BROADLINK_MODE_MANUAL,
+                                                         loop_mode=self._thermostat_loop_mode,
+                                                         sensor=self.thermostat_get_sensor(),
+                                                         temp=target_temp)
+            if success:
+                # Save temperatures for future use
+                if self._preset_mode == PRESET_AWAY:
+                    self._away_setpoint = target_temp
+                elif self._preset_mode == PRESET_NONE:
+                    self._manual_setpoint = target_temp
+
+                # Show new state until coordinator confirms it
+                self._thermostat_target_temp = target_temp
+                self._thermostat_current_mode = HVAC_MODE_HEAT
+
+        self._coordinator.async_command_sent()
+        self._async_write_state()
+        return success
+
+    async def async_set_hvac_mode(self, hvac_mode) -> bool:
         """Set operation mode."""
-        try:
-            device = self._thermostat.device()
-            if device.auth():
-                if hvac_mode == HVAC_MODE_OFF:
-                    device.set_power(BROADLINK_POWER_OFF)
-                else:
-                    device.set_power(BROADLINK_POWER_ON)
-                    if hvac_mode == HVAC_MODE_AUTO:
-                        device.set_mode(BROADLINK_MODE_AUTO, self._thermostat_loop_mode, self.thermostat_get_sensor())
-                    elif hvac_mode == HVAC_MODE_HEAT:
-                        device.set_mode(BROADLINK_MODE_MANUAL, self._thermostat_loop_mode, self.thermostat_get_sensor())
-        except timeout:
-            pass
-
-        await self.async_update_ha_state()
-
-    async def async_set_preset_mode(self, preset_mode) -> None:
+        if hvac_mode == HVAC_MODE_OFF:
+            success = await self._thermostat.async_write(power=BROADLINK_POWER_OFF)
+        elif hvac_mode == HVAC_MODE_AUTO:
+            success = await self._thermostat.async_write(power=BROADLINK_POWER_ON,
+                                                         auto_mode=BROADLINK_MODE_AUTO,
+                                                         loop_mode=self._thermostat_loop_mode,
+                                                         sensor=self.thermostat_get_sensor())
+        elif hvac_mode == HVAC_MODE_HEAT:
+            success = await self._thermostat.async_write(power=BROADLINK_POWER_ON,
+                                                         auto_mode=BROADLINK_MODE_MANUAL,
+                                                         loop_mode=self._thermostat_loop_mode,
+                                                         sensor=self.thermostat_get_sensor())
+        else:
+            success = False
+
+        # Show new state until coordinator confirms it
+        if success:
+            self._thermostat_current_mode = hvac_mode
+            if hvac_mode == HVAC_MODE_OFF:
+                self._thermostat_current_action = CURRENT_HVAC_OFF
+            if hvac_mode != HVAC_MODE_HEAT:
+                self._preset_mode = PRESET_NONE
+
+        self._coordinator.async_command_sent()
+        self._async_write_state()
+        return success
+
+    async def async_set_preset_mode(self, preset_mode) -> bool:
         """Set new preset mode."""
         self._preset_mode = preset_mode
 
-        try:
-            device = self._thermostat.device()
-            if device.auth():
-                device.set_power(BROADLINK_POWER_ON)
-                device.set_mode(BROADLINK_MODE_MANUAL, self._thermostat_loop_mode, self.thermostat_get_sensor())
-                if self._preset_mode == PRESET_AWAY:
-                    device.set_temp(self._away_setpoint)
-                elif self._preset_mode == PRESET_NONE:
-                    device.set_temp(self._manual_setpoint)
-        except timeout:
-            pass
-
-        await self.async_update_ha_state()
+        if self._preset_mode == PRESET_AWAY:
+            target_temp = self._away_setpoint
+        elif self._preset_mode == PRESET_NONE:
+            target_temp = self._manual_setpoint
+        else:
+            target_temp = None
+
+        success = await self._thermostat.async_write(power=BROADLINK_POWER_ON,
+                                                     auto_mode=BROADLINK_MODE_MANUAL,
+                                                     loop_mode=self._thermostat_loop_mode,
+                                                     sensor=self.thermostat_get_sensor(),
+                                                     temp=target_temp)
+        if success:
+            # Show new state until coordinator confirms it
+            self._thermostat_current_mode = HVAC_MODE_HEAT
+            if target_temp is not None:
+                self._thermostat_target_temp = target_temp
+
+        self._coordinator.async_command_sent()
+        self._async_write_state()
+        return success
+
+    async def async_set_schedule(self, weekday, weekend) -> bool:
+        """Program weekly schedule, written only if it differs from the one on thermostat"""
+        return await self._thermostat.async_set_schedule(weekday, weekend)
 
     async def async_turn_off(self) -> None:
         """Turn thermostat off"""
@@ -266,8 +449,16 @@ class FloureonClimate(ClimateEntity, RestoreEntity):
 
     async def async_update(self) -> None:
         """Get thermostat info"""
-        data = self._thermostat.thermostat_read_status()
+        await self._coordinator.async_refresh()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle status pushed by coordinator"""
+        self._update_status(self._coordinator.data)
+        self._async_write_state()
 
+    def _update_status(self, data) -> None:
+        """Update thermostat info from status"""
         if not data:
             return
 
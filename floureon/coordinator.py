@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import time
+import zlib
+from collections import deque
+from datetime import timedelta
+
+from custom_components.floureon import (
+    BroadlinkThermostat,
+    CONF_HOST,
+    CONF_MAC,
+    CONF_TRANSPORT,
+    DEFAULT_TRANSPORT,
+    DOMAIN
+)
+from custom_components.floureon.telemetry import TelemetryBuffer
+
+from homeassistant.const import CONF_SCAN_INTERVAL, EVENT_HOMEASSISTANT_STARTED
+from homeassistant.core import CoreState, callback
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SCAN_INTERVAL = timedelta(seconds=30)
+
+# Poll fast for a while after a command or when heating state / room temperature changes
+FAST_POLL_INTERVAL = timedelta(seconds=5)
+FAST_POLL_WINDOW = timedelta(seconds=60)
+# Confirm commands with a single status read once writes stop coming in for this long
+REFRESH_AFTER_WRITE_DELAY = timedelta(seconds=1)
+# Double interval each time readings stayed flat for a whole interval, up to scan interval times this factor
+SLOW_POLL_FACTOR = 4
+# Window over which poll rate is reported
+POLL_RATE_WINDOW = timedelta(hours=1)
+# Thermostats initialized at the same time once Home Assistant has started
+STARTUP_CONCURRENCY = 8
+# Correct thermostat clock drift this often
+TIME_SYNC_INTERVAL = timedelta(hours=6)
+
+DATA_STARTUP = 'floureon_startup'
+
+
+@callback
+def async_get_coordinator(hass, config):
+    """Get status coordinator shared by all entities of the same thermostat"""
+    coordinators = hass.data.setdefault(DOMAIN, {})
+    key = (config.get(CONF_HOST), config.get(CONF_MAC).lower())
+    if key not in coordinators:
+        thermostat = BroadlinkThermostat(config.get(CONF_HOST), config.get(CONF_MAC),
+                                         transport=config.get(CONF_TRANSPORT, DEFAULT_TRANSPORT))
+        coordinators[key] = ThermostatCoordinator(hass, thermostat,
+                                                  config.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
+                                                  '{0}-{1}'.format(*key))
+    return coordinators[key]
+
+
+class StateChangeFilter:
+    """Tell whether entity state differs from the one written last time"""
+
+    def __init__(self, heartbeat=None):
+        self._heartbeat = heartbeat.total_seconds() if heartbeat else None
+        self._state = None
+        self._written = None
+
+    def changed(self, state) -> bool:
+        """Return True and remember state if it changed or heartbeat interval has passed since last write"""
+        now = time.monotonic()
+        if self._written is not None and state == self._state \
+                and (self._heartbeat is None or now - self._written < self._heartbeat):
+            return False
+        self._state = state
+        self._written = now
+        return True
+
+
+class ThermostatCoordinator:
+
+    def __init__(self, hass, thermostat, update_interval, name):
+        self.hass = hass
+        self.thermostat = thermostat
+        self.update_interval = update_interval
+        self.data = None
+        self.telemetry = TelemetryBuffer()
+
+        self._name = name
+        self._listeners = []
+        self._refresh = None
+        self._unsub_refresh = None
+
+        self._interval = update_interval.total_seconds()
+        self._fast_until = 0
+        self._flat_since = None
+        self._commands_sent = 0
+        self._polls = deque()
+
+        self.started = False
+        self._startup = None
+        self._unsub_startup = None
+        self._unsub_time_sync = None
+
+    @property
+    def poll_interval(self) -> float:
+        """Return current poll interval in seconds"""
+        return self._interval
+
+    @property
+    def poll_rate(self) -> float:
+        """Return polls per minute over last POLL_RATE_WINDOW"""
+        self._expire_polls()
+        if not self._polls:
+            return 0.0
+        window = min(POLL_RATE_WINDOW.total_seconds(), max(time.monotonic() - self._polls[0], self._interval))
+        return round(len(self._polls) / window * 60, 2)
+
+    @property
+    def jitter(self) -> float:
+        """Return deterministic offset of this thermostat within scan interval, in seconds"""
+        return zlib.crc32(self._name.encode()) / 0xffffffff * self.update_interval.total_seconds()
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Subscribe entity to status updates, return callable to unsubscribe"""
+        if not self._listeners:
+            self._async_schedule_startup()
+
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+            if not self._listeners:
+                self._async_stop()
+
+        return remove_listener
+
+    @callback
+    def _async_schedule_startup(self) -> None:
+        """Initialize thermostat once all entities are registered and Home Assistant has started"""
+        if self.hass.state == CoreState.running:
+            self._async_start()
+        else:
+            self._unsub_startup = self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STARTED, self._async_start)
+
+    @callback
+    def _async_start(self, event=None) -> None:
+        """Start initialization and periodic clock sync"""
+        self._unsub_startup = None
+        if self.started:
+            # Entities were re-added after the last one was removed, resume polling
+            self._schedule_refresh(self.jitter)
+        elif self._startup is None:
+            self._startup = self.hass.async_create_task(self._async_startup())
+        self._unsub_time_sync = async_track_time_interval(self.hass, self._async_time_sync, TIME_SYNC_INTERVAL)
+
+    @callback
+    def _async_stop(self) -> None:
+        """Stop initialization, polling and clock sync when the last entity is removed"""
+        for unsub in [self._unsub_startup, self._unsub_refresh, self._unsub_time_sync]:
+            if unsub is not None:
+                unsub()
+        self._unsub_startup = self._unsub_refresh = self._unsub_time_sync = None
+        if self._startup is not None:
+            self._startup.cancel()
+            self._startup = None
+
+    async def _async_startup(self) -> None:
+        """Set thermostat time and read first status, limited to STARTUP_CONCURRENCY thermostats at once"""
+        semaphore = self.hass.data.setdefault(DATA_STARTUP, asyncio.Semaphore(STARTUP_CONCURRENCY))
+        try:
+            async with semaphore:
+                await asyncio.gather(self.thermostat.async_set_time(), self.async_refresh())
+        finally:
+            self._startup = None
+
+        # Spread regular polls of thermostats started together over scan interval
+        if self._listeners:
+            self._schedule_refresh(self.jitter)
+
+    async def _async_time_sync(self, now) -> None:
+        """Correct thermostat clock drift"""
+        if not await self.thermostat.async_set_time():
+            _LOGGER.debug("Thermostat %s time sync failed", self._name)
+
+    @callback
+    def async_command_sent(self) -> None:
+        """Confirm command with a debounced status read, then poll fast for a while"""
+        self._commands_sent += 1
+        self._fast_until = time.monotonic() + FAST_POLL_WINDOW.total_seconds()
+        self._interval = FAST_POLL_INTERVAL.total_seconds()
+        if self._listeners:
+            self._schedule_refresh(REFRESH_AFTER_WRITE_DELAY.total_seconds())
+
+    @callback
+    def _schedule_refresh(self, delay) -> None:
+        """Schedule next poll"""
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+        self._unsub_refresh = async_call_later(self.hass, delay, self._async_handle_interval)
+
+    async def _async_handle_interval(self, now) -> None:
+        """Poll thermostat on interval"""
+        self._unsub_refresh = None
+        await self.async_refresh()
+
+    async def async_refresh(self) -> None:
+        """Read thermostat status or join read already in flight"""
+        if self._refresh is None:
+            self._refresh = self.hass.async_create_task(self._async_refresh())
+        await asyncio.shield(self._refresh)
+
+    async def _async_refresh(self) -> None:
+        """Read thermostat status and push it to subscribed entities"""
+        commands_sent = self._commands_sent
+        try:
+            data = await self.thermostat.async_read_status()
+        finally:
+            self._refresh = None
+
+        self._polls.append(time.monotonic())
+        if data is not None:
+            self.telemetry.append(data)
+
+        if commands_sent != self._commands_sent:
+            # Status may predate command, keep optimistic state until confirmation read
+            if self._listeners:
+                self._schedule_refresh(REFRESH_AFTER_WRITE_DELAY.total_seconds())
+            return
+        self._adapt_interval(self.data, data)
+        self.data = data
+        if data is not None:
+            self.started = True
+
+        if self._listeners:
+            self._schedule_refresh(self._interval)
+
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    def _adapt_interval(self, old, new) -> None:
+        """Poll fast after changes, back off exponentially while readings stay flat"""
+        now = time.monotonic()
+        base = self.update_interval.total_seconds()
+
+        flat = False
+        if old and new:
+            if old['active'] != new['active'] or old['room_temp'] != new['room_temp']:
+                self._fast_until = now + FAST_POLL_WINDOW.total_seconds()
+            else:
+                flat = True
+        if not flat:
+            self._flat_since = None
+        elif self._flat_since is None:
+            self._flat_since = now
+
+        if not new:
+            interval = base
+        elif now < self._fast_until:
+            interval = FAST_POLL_INTERVAL.total_seconds()
+        elif self._interval < base:
+            interval = base
+        elif flat and now - self._flat_since >= self._interval:
+            # Extra refreshes in between do not count, only time readings stayed flat
+            interval = min(self._interval * 2, base * SLOW_POLL_FACTOR)
+            self._flat_since = now
+        else:
+            interval = self._interval
+
+        if interval != self._interval:
+            _LOGGER.debug("Thermostat %s poll interval %ss (%s polls/min)", self._name, interval, self.poll_rate)
+        self._interval = interval
+
+    def _expire_polls(self) -> None:
+        """Forget polls outside of rate window"""
+        since = time.monotonic() - POLL_RATE_WINDOW.total_seconds()
+        while self._polls and self._polls[0] < since:
+            self._polls.popleft()
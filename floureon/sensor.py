@@ -0,0 +1,138 @@
+import json
+import logging
+from functools import partial
+
+import voluptuous as vol
+
+from custom_components.floureon import (
+    CONF_HOST,
+    CONF_MAC,
+    CONF_TRANSPORT,
+    DEFAULT_TRANSPORT,
+    DOMAIN,
+    TRANSPORT_BROADLINK,
+    TRANSPORT_ASYNCIO
+)
+from custom_components.floureon.coordinator import async_get_coordinator
+
+from homeassistant.components.sensor import PLATFORM_SCHEMA
+from homeassistant.const import (
+    CONF_MONITORED_CONDITIONS,
+    CONF_NAME,
+    DEVICE_CLASS_TIMESTAMP,
+    TIME_MILLISECONDS
+)
+from homeassistant.helpers.entity import Entity
+from homeassistant.util import dt as dt_util
+
+import homeassistant.helpers.config_validation as cv
+
+_LOGGER = logging.getLogger(__name__)
+
+SENSOR_LAST_SUCCESS = 'last_success'
+SENSOR_LATENCY = 'latency'
+SENSOR_TIMEOUTS = 'timeouts'
+SENSOR_ERRORS = 'errors'
+SENSOR_RETRIES = 'retries'
+SENSOR_SESSION_REUSED = 'session_reused'
+SENSOR_SESSION_ESTABLISHED = 'session_established'
+
+SENSOR_TYPES = {
+    SENSOR_LAST_SUCCESS: ('Last Success', None, DEVICE_CLASS_TIMESTAMP),
+    SENSOR_LATENCY: ('Latency', TIME_MILLISECONDS, None),
+    SENSOR_TIMEOUTS: ('Timeouts', None, None),
+    SENSOR_ERRORS: ('Errors', None, None),
+    SENSOR_RETRIES: ('Retries', None, None),
+    SENSOR_SESSION_REUSED: ('Session Reused', None, None),
+    SENSOR_SESSION_ESTABLISHED: ('Session Established', None, None),
+}
+
+SERVICE_DUMP_STATS = 'dump_stats'
+
+PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
+    vol.Required(CONF_HOST): cv.string,
+    vol.Required(CONF_MAC): cv.string,
+    vol.Required(CONF_NAME): cv.string,
+    vol.Optional(CONF_TRANSPORT, default=DEFAULT_TRANSPORT): vol.In([TRANSPORT_BROADLINK, TRANSPORT_ASYNCIO]),
+    vol.Optional(CONF_MONITORED_CONDITIONS, default=list(SENSOR_TYPES)): vol.All(cv.ensure_list,
+                                                                                [vol.In(SENSOR_TYPES)]),
+})
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up diagnostic sensors of thermostat."""
+    coordinator = async_get_coordinator(hass, config)
+    async_add_entities([
+        FloureonDiagnosticSensor(config.get(CONF_NAME), coordinator, sensor_type)
+        for sensor_type in config.get(CONF_MONITORED_CONDITIONS)
+    ])
+
+    if not hass.services.has_service(DOMAIN, SERVICE_DUMP_STATS):
+        hass.services.async_register(DOMAIN, SERVICE_DUMP_STATS, partial(async_dump_stats, hass))
+
+
+async def async_dump_stats(hass, call) -> None:
+    """Log latency and error counters and poll rate of all thermostats as JSON"""
+    snapshot = {}
+    for key, coordinator in hass.data.get(DOMAIN, {}).items():
+        stats = coordinator.thermostat.stats.snapshot()
+        stats['poll_interval'] = coordinator.poll_interval
+        stats['poll_rate'] = coordinator.poll_rate
+        snapshot['{0}-{1}'.format(*key)] = stats
+    _LOGGER.info("Thermostat stats: %s", json.dumps(snapshot, sort_keys=True))
+
+
+class FloureonDiagnosticSensor(Entity):
+
+    def __init__(self, name, coordinator, sensor_type):
+        self._coordinator = coordinator
+        self._stats = coordinator.thermostat.stats
+        self._sensor_type = sensor_type
+        self._name = '{0} {1}'.format(name, SENSOR_TYPES[sensor_type][0])
+
+    @property
+    def name(self) -> str:
+        """Return sensor name"""
+        return self._name
+
+    @property
+    def should_poll(self) -> bool:
+        """Updated together with thermostat status"""
+        return False
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return SENSOR_TYPES[self._sensor_type][1]
+
+    @property
+    def device_class(self):
+        """Return the device class."""
+        return SENSOR_TYPES[self._sensor_type][2]
+
+    @property
+    def state(self):
+        """Return sensor value"""
+        if self._sensor_type == SENSOR_LAST_SUCCESS:
+            if self._stats.last_success is None:
+                return None
+            return dt_util.utc_from_timestamp(self._stats.last_success).isoformat()
+        if self._sensor_type == SENSOR_LATENCY:
+            return self._stats.percentiles(0.99).get('get_status')
+        return getattr(self._stats, self._sensor_type)
+
+    @property
+    def device_state_attributes(self) -> dict:
+        """Return per operation counters"""
+        if self._sensor_type == SENSOR_LATENCY:
+            return {
+                '{0}_p50'.format(name): latency
+                for name, latency in self._stats.percentiles(0.5).items()
+            }
+        if self._sensor_type in (SENSOR_TIMEOUTS, SENSOR_ERRORS):
+            return self._stats.counts(self._sensor_type)
+        return None
+
+    async def async_added_to_hass(self) -> None:
+        """Subscribe to status updates"""
+        self.async_on_remove(self._coordinator.async_add_listener(self.async_write_ha_state))
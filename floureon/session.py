@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socket import timeout
+
+from broadlink.exceptions import (
+    AuthenticationError,
+    AuthorizationError,
+    ConnectionClosedError,
+    DeviceOfflineError
+)
+
+from .breaker import CircuitBreaker
+from .stats import DeviceStats
+from .transport import AsyncHysenDevice, HysenDevice, async_get_transport
+
+_LOGGER = logging.getLogger(__name__)
+
+# Threads running blocking thermostat I/O of all thermostats
+DEFAULT_MAX_WORKERS = 8
+
+# Last read status older than this is not trusted for write elision
+STATUS_MAX_AGE = 300
+# Writes issued within this window are merged into single exchange
+WRITE_COALESCE_DELAY = 0.2
+
+# Device rejected our session key, re-authenticate and retry right away
+SESSION_REJECTED_ERRORS = (AuthenticationError, AuthorizationError, ConnectionClosedError)
+# Device did not answer, drop session so next call re-authenticates
+SESSION_TIMEOUT_ERRORS = (timeout, DeviceOfflineError)
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+_EXECUTOR = None
+
+
+def get_session(host, port, mac, timeout, transport):
+    """Get authenticated session shared by all entities of the same thermostat"""
+    key = (host, mac)
+    with _SESSIONS_LOCK:
+        if key not in _SESSIONS:
+            _SESSIONS[key] = BroadlinkSession(host, port, mac, timeout, transport)
+        return _SESSIONS[key]
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get bounded executor used for all blocking thermostat I/O"""
+    global _EXECUTOR
+    with _SESSIONS_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix='floureon')
+        return _EXECUTOR
+
+
+class CommandQueue:
+    """Run exchanges with one thermostat one at a time, writes before reads.
+
+    Queued writes of the same kind are merged, newest values win. A read joins
+    read already queued, or one in flight if no write is waiting.
+    """
+
+    def __init__(self):
+        self._writes = {}
+        self._read = None
+        self._reading = None
+        self._worker = None
+
+    @property
+    def pending(self) -> int:
+        """Return number of queued exchanges"""
+        return len(self._writes) + (1 if self._read is not None else 0)
+
+    def write(self, name, func, **fields) -> asyncio.Future:
+        """Queue func(fields), return future of its result"""
+        if name in self._writes:
+            _, queued, queued_at, future = self._writes.pop(name)
+            queued.update(fields)
+        else:
+            queued, queued_at, future = dict(fields), time.monotonic(), asyncio.get_event_loop().create_future()
+        self._writes[name] = (func, queued, queued_at, future)
+        self._start()
+        return future
+
+    def read(self, func, full=False) -> asyncio.Future:
+        """Queue func(full) unless a read which satisfies it is queued or running, return future of its result"""
+        if self._read is not None:
+            queued_func, queued_full, future = self._read
+            self._read = (func, True, future) if full and not queued_full else self._read
+            return future
+        if self._reading is not None and not self._writes and (self._reading[0] or not full):
+            return self._reading[1]
+
+        future = asyncio.get_event_loop().create_future()
+        self._read = (func, full, future)
+        self._start()
+        return future
+
+    def _start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        try:
+            while self._writes or self._read is not None:
+                if self._writes:
+                    name = next(iter(self._writes))
+                    # Let writes issued right after this one merge into it
+                    delay = self._writes[name][2] + WRITE_COALESCE_DELAY - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    func, fields, _, future = self._writes.pop(name)
+                    await self._call(future, func, fields)
+                else:
+                    func, full, future = self._read
+                    self._read = None
+                    self._reading = (full, future)
+                    try:
+                        await self._call(future, func, full)
+                    finally:
+                        self._reading = None
+        finally:
+            self._worker = None
+
+    @staticmethod
+    async def _call(future, func, arg) -> None:
+        try:
+            result = await func(arg)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+
+class BroadlinkSession:
+
+    def __init__(self, host, port, mac, timeout, transport):
+        self._host = host
+        self._port = port
+        self._mac = mac
+        self._timeout = timeout
+        self._device = None
+        self._lock = threading.RLock()
+        self._async_lock = None
+
+        self._status = None
+        self._status_updated = None
+        self.writes = 0
+        self.schedule = None
+
+        self.transport = transport
+        self.breaker = CircuitBreaker(host)
+        self.stats = DeviceStats(host)
+        self.queue = CommandQueue()
+
+    def _authenticate(self):
+        """Create device and exchange session key"""
+        device = HysenDevice((self._host, self._port), self._mac, self._timeout)
+        if not self._call('auth', device.auth):
+            raise AuthenticationError("Authentication failed")
+
+        self._established()
+        return device
+
+    async def _async_authenticate(self):
+        """Create device on shared UDP transport and exchange session key"""
+        loop = asyncio.get_event_loop()
+        addresses = await loop.getaddrinfo(self._host, self._port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        device = AsyncHysenDevice(await async_get_transport(), addresses[0][4], self._mac, self._timeout)
+        await self._async_call('auth', device.async_auth)
+
+        self._established()
+        return device
+
+    def _established(self) -> None:
+        self.stats.establish()
+        _LOGGER.debug("Thermostat %s session established (reused: %d, established: %d)",
+                      self._host, self.stats.session_reused, self.stats.session_established)
+
+    def _call(self, name, func, *args):
+        """Call func and record its latency and outcome as operation name"""
+        started = time.monotonic()
+        try:
+            result = func(*args)
+        except SESSION_TIMEOUT_ERRORS:
+            self.stats.timeout(name, time.monotonic() - started)
+            raise
+        except Exception:
+            self.stats.error(name, time.monotonic() - started)
+            raise
+        self.stats.success(name, time.monotonic() - started)
+        return result
+
+    async def _async_call(self, name, func, *args):
+        """Await func and record its latency and outcome as operation name"""
+        started = time.monotonic()
+        try:
+            result = await func(*args)
+        except SESSION_TIMEOUT_ERRORS:
+            self.stats.timeout(name, time.monotonic() - started)
+            raise
+        except Exception:
+            self.stats.error(name, time.monotonic() - started)
+            raise
+        self.stats.success(name, time.monotonic() - started)
+        return result
+
+    def get_status(self, max_age=STATUS_MAX_AGE):
+        """Return copy of last known status or None if it is unknown or too old"""
+        with self._lock:
+            if self._status is None or time.monotonic() - self._status_updated > max_age:
+                return None
+            return dict(self._status)
+
+    def set_status(self, status, writes) -> None:
+        """Store last known status unless it was read before a write finished"""
+        with self._lock:
+            if 'weekday' in status:
+                self.schedule = {'weekday': status['weekday'], 'weekend': status['weekend']}
+            if writes != self.writes:
+                return
+            self._status = dict(status)
+            self._status_updated = time.monotonic()
+
+    def update_status(self, **fields) -> None:
+        """Update last known status after successful write"""
+        if not fields:
+            return
+        with self._lock:
+            self.writes += 1
+            if self._status is not None:
+                self._status.update(fields)
+
+    def invalidate(self) -> None:
+        """Drop session, next call will re-authenticate"""
+        with self._lock:
+            self._device = None
+
+    def execute(self, method, *args):
+        """Call device method on authenticated device, re-authenticate if session key is rejected"""
+        with self._lock:
+            if self._device is not None:
+                self.stats.reuse()
+                try:
+                    return self._call(method, getattr(self._device, method), *args)
+                except SESSION_REJECTED_ERRORS:
+                    _LOGGER.debug("Thermostat %s rejected session key, re-authenticating", self._host)
+                    self.stats.retry()
+                    self._device = None
+                except SESSION_TIMEOUT_ERRORS:
+                    self._device = None
+                    raise
+
+            self._device = self._authenticate()
+            try:
+                return self._call(method, getattr(self._device, method), *args)
+            except SESSION_REJECTED_ERRORS + SESSION_TIMEOUT_ERRORS:
+                self._device = None
+                raise
+
+    async def async_execute(self, method, *args):
+        """Call device method over shared UDP transport, see execute"""
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+
+        async with self._async_lock:
+            if self._device is not None:
+                self.stats.reuse()
+                try:
+                    return await self._async_call(method, self._device.async_call, method, *args)
+                except SESSION_REJECTED_ERRORS:
+                    _LOGGER.debug("Thermostat %s rejected session key, re-authenticating", self._host)
+                    self.stats.retry()
+                    self._device = None
+                except SESSION_TIMEOUT_ERRORS:
+                    self._device = None
+                    raise
+
+            self._device = await self._async_authenticate()
+            try:
+                return await self._async_call(method, self._device.async_call, method, *args)
+            except SESSION_REJECTED_ERRORS + SESSION_TIMEOUT_ERRORS:
+                self._device = None
+                raise
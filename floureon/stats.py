@@ -0,0 +1,148 @@
+import bisect
+import threading
+import time
+
+# Upper bounds of latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed) -> None:
+        """Add latency in seconds"""
+        ms = elapsed * 1000
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, fraction) -> float:
+        """Return upper bound of bucket holding given fraction of samples, in milliseconds"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return round(self.max, 1)
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 1) if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max, 1),
+            'buckets': {
+                ('le_{0}'.format(bound) if bound is not None else 'inf'): count
+                for bound, count in zip(LATENCY_BUCKETS + (None,), self.counts)
+            }
+        }
+
+
+class OperationStats:
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def as_dict(self) -> dict:
+        return dict(calls=self.calls, timeouts=self.timeouts, errors=self.errors, latency=self.latency.as_dict())
+
+
+class DeviceStats:
+    """Latency and outcome of every exchange with one thermostat"""
+
+    def __init__(self, host):
+        self.host = host
+        self.operations = {}
+        self.retries = 0
+        self.session_reused = 0
+        self.session_established = 0
+        self.last_success = None
+        self._lock = threading.Lock()
+
+    def _operation(self, name) -> OperationStats:
+        if name not in self.operations:
+            self.operations[name] = OperationStats()
+        return self.operations[name]
+
+    def success(self, name, elapsed) -> None:
+        with self._lock:
+            operation = self._operation(name)
+            operation.calls += 1
+            operation.latency.add(elapsed)
+            self.last_success = time.time()
+
+    def timeout(self, name, elapsed) -> None:
+        with self._lock:
+            operation = self._operation(name)
+            operation.calls += 1
+            operation.timeouts += 1
+            operation.latency.add(elapsed)
+
+    def error(self, name, elapsed) -> None:
+        with self._lock:
+            operation = self._operation(name)
+            operation.calls += 1
+            operation.errors += 1
+            operation.latency.add(elapsed)
+
+    def retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def reuse(self) -> None:
+        with self._lock:
+            self.session_reused += 1
+
+    def establish(self) -> None:
+        with self._lock:
+            self.session_established += 1
+
+    def _total(self, field) -> int:
+        return sum(getattr(operation, field) for operation in self.operations.values())
+
+    @property
+    def timeouts(self) -> int:
+        with self._lock:
+            return self._total('timeouts')
+
+    @property
+    def errors(self) -> int:
+        with self._lock:
+            return self._total('errors')
+
+    def counts(self, field) -> dict:
+        """Return given counter of every operation"""
+        with self._lock:
+            return {name: getattr(operation, field) for name, operation in self.operations.items()}
+
+    def percentiles(self, fraction) -> dict:
+        """Return latency percentile of every operation, in milliseconds"""
+        with self._lock:
+            return {name: operation.latency.percentile(fraction) for name, operation in self.operations.items()}
+
+    def snapshot(self) -> dict:
+        """Return JSON serializable copy of all counters"""
+        with self._lock:
+            return {
+                'host': self.host,
+                'last_success': self.last_success,
+                'retries': self.retries,
+                'session_reused': self.session_reused,
+                'session_established': self.session_established,
+                'timeouts': self._total('timeouts'),
+                'errors': self._total('errors'),
+                'operations': {name: operation.as_dict() for name, operation in sorted(self.operations.items())}
+            }
@@ -1,12 +1,15 @@
-from socket import timeout
 from custom_components.floureon import (
-    BroadlinkThermostat,
+    CONF_HEARTBEAT,
     CONF_HOST,
     CONF_MAC,
+    CONF_TRANSPORT,
     CONF_USE_EXTERNAL_TEMP,
     CONF_USE_EXTERNAL_TEMP,
     DEFAULT_SCHEDULE,
     DEFAULT_USE_EXTERNAL_TEMP,
+    DEFAULT_TRANSPORT,
+    TRANSPORT_BROADLINK,
+    TRANSPORT_ASYNCIO,
     BROADLINK_POWER_ON,
     BROADLINK_POWER_OFF,
     BROADLINK_MODE_MANUAL,
@@ -14,6 +17,7 @@ from custom_components.floureon import (
     BROADLINK_SENSOR_EXTERNAL,
     BROADLINK_SENSOR_INTERNAL
 )
+from custom_components.floureon.coordinator import StateChangeFilter, async_get_coordinator
 
 import logging
 _LOGGER = logging.getLogger(__name__)
@@ -21,6 +25,7 @@ _LOGGER = logging.getLogger(__name__)
 import voluptuous as vol
 
 from homeassistant.components.switch import SwitchDevice, PLATFORM_SCHEMA
+from homeassistant.core import callback
 from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.const import (
     CONF_NAME,
@@ -51,20 +56,23 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Required(CONF_MAC): cv.string,
     vol.Required(CONF_NAME): cv.string,
     vol.Optional(CONF_USE_EXTERNAL_TEMP, default=DEFAULT_USE_EXTERNAL_TEMP): cv.boolean,
+    vol.Optional(CONF_TRANSPORT, default=DEFAULT_TRANSPORT): vol.In([TRANSPORT_BROADLINK, TRANSPORT_ASYNCIO]),
     vol.Optional(CONF_TURN_OFF_MODE, default=DEFAULT_TURN_OFF_MODE): vol.Any(BROADLINK_MIN_TEMP, BROADLINK_TURN_OFF),
-    vol.Optional(CONF_TURN_ON_MODE, default=DEFAULT_TURN_ON_MODE): vol.Any(float, BROADLINK_MAX_TEMP)
+    vol.Optional(CONF_TURN_ON_MODE, default=DEFAULT_TURN_ON_MODE): vol.Any(float, BROADLINK_MAX_TEMP),
+    vol.Optional(CONF_HEARTBEAT): cv.time_period
 })
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the platform."""
-    async_add_entities([FloureonSwitch(config)])
+    async_add_entities([FloureonSwitch(config, async_get_coordinator(hass, config))])
 
 
 class FloureonSwitch(SwitchDevice, RestoreEntity):
 
-    def __init__(self, config):
-        self._thermostat = BroadlinkThermostat(config.get(CONF_HOST), config.get(CONF_MAC))
+    def __init__(self, config, coordinator):
+        self._coordinator = coordinator
+        self._thermostat = coordinator.thermostat
 
         self._name = config.get(CONF_NAME)
 
@@ -78,6 +86,9 @@ class FloureonSwitch(SwitchDevice, RestoreEntity):
 
         self._state = STATE_UNAVAILABLE
 
+        self._attributes = {}
+        self._state_filter = StateChangeFilter(config.get(CONF_HEARTBEAT))
+
     def thermostat_get_sensor(self) -> int:
         """Get sensor to use"""
         return BROADLINK_SENSOR_EXTERNAL if self._use_external_temp is True else BROADLINK_SENSOR_INTERNAL
@@ -87,44 +98,81 @@ class FloureonSwitch(SwitchDevice, RestoreEntity):
         """Return the name of the device if any."""
         return self._name
 
+    @property
+    def should_poll(self) -> bool:
+        """Status is pushed by coordinator"""
+        return False
+
+    @property
+    def available(self) -> bool:
+        """Pending until coordinator has read first status"""
+        return self._coordinator.started
+
     @property
     def is_on(self) -> bool:
         """Return thermostat state on / off"""
         return self._state == STATE_ON
 
+    @property
+    def device_state_attributes(self) -> dict:
+        """Return the attribute(s) of the switch"""
+        return self._attributes
+
+    @callback
+    def _async_write_state(self) -> None:
+        """Write state only if something visible changed or heartbeat is due"""
+        attributes = {
+            'breaker_state': self._thermostat.breaker_state,
+            'failures': self._thermostat.failure_count
+        }
+        if attributes != self._attributes:
+            self._attributes = attributes
+        if self._state_filter.changed((self.available, self._state, tuple(self._attributes.items()))):
+            self.async_write_ha_state()
+
     async def async_turn_on(self, **kwargs) -> None:
         """Turn  the entity on"""
-        try:
-            device = self._thermostat.device()
-            if device.auth():
-                device.set_power(BROADLINK_POWER_ON)
-                device.set_mode(BROADLINK_MODE_MANUAL, 0, self.thermostat_get_sensor())
-                device.set_temp(self._max_temp if self._turn_on_mode == BROADLINK_MAX_TEMP else self._turn_on_mode)
-        except timeout:
-            pass
+        await self._thermostat.async_write(power=BROADLINK_POWER_ON,
+                                           auto_mode=BROADLINK_MODE_MANUAL,
+                                           loop_mode=0,
+                                           sensor=self.thermostat_get_sensor(),
+                                           temp=self._max_temp if self._turn_on_mode == BROADLINK_MAX_TEMP else self._turn_on_mode)
 
         self._state = STATE_ON
-        await self.async_update_ha_state()
+        self._coordinator.async_command_sent()
+        self._async_write_state()
 
     async def async_turn_off(self, **kwargs) -> None:
         """Turn the entity off"""
-        try:
-            device = self._thermostat.device()
-            if device.auth():
-                if self._turn_off_mode == BROADLINK_TURN_OFF:
-                    device.set_power(BROADLINK_POWER_OFF)
-                else:
-                    device.set_mode(BROADLINK_MODE_MANUAL, 0, self.thermostat_get_sensor())
-                    device.set_temp(self._min_temp)                
-        except timeout:
-            pass
+        if self._turn_off_mode == BROADLINK_TURN_OFF:
+            await self._thermostat.async_write(power=BROADLINK_POWER_OFF)
+        else:
+            await self._thermostat.async_write(auto_mode=BROADLINK_MODE_MANUAL,
+                                               loop_mode=0,
+                                               sensor=self.thermostat_get_sensor(),
+                                               temp=self._min_temp)
 
         self._state = STATE_OFF
-        await self.async_update_ha_state()
+        self._coordinator.async_command_sent()
+        self._async_write_state()
+
+    async def async_added_to_hass(self) -> None:
+        """Run when entity about to added."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_coordinator_update))
 
     async def async_update(self) -> None:
         """Get thermostat info"""
-        data = self._thermostat.thermostat_read_status()
+        await self._coordinator.async_refresh()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle status pushed by coordinator"""
+        self._update_status(self._coordinator.data)
+        self._async_write_state()
+
+    def _update_status(self, data) -> None:
+        """Update thermostat info from status"""
         if not data:
             self._state = STATE_UNAVAILABLE
             return
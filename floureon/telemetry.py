@@ -0,0 +1,84 @@
+import time
+from array import array
+
+# Seconds of readings temperature rate and duty cycle are computed over
+RATE_WINDOW = 15 * 60
+DUTY_CYCLE_WINDOW = 60 * 60
+# Readings kept per thermostat, enough for duty cycle window at fast poll interval (5 seconds)
+TELEMETRY_SIZE = 720
+
+
+class TelemetryBuffer:
+    """Fixed size ring buffer of thermostat readings, one array per column"""
+
+    def __init__(self, size=TELEMETRY_SIZE):
+        self.size = size
+        self.count = 0
+        self._next = 0
+        self._time = array('d', [0.0]) * size
+        self._room_temp = array('f', [0.0]) * size
+        self._external_temp = array('f', [0.0]) * size
+        self._setpoint = array('f', [0.0]) * size
+        self._active = array('b', [0]) * size
+
+    def append(self, data, timestamp=None) -> None:
+        """Add reading from thermostat status"""
+        i = self._next
+        self._time[i] = timestamp if timestamp is not None else time.time()
+        self._room_temp[i] = data['room_temp']
+        self._external_temp[i] = data['external_temp']
+        self._setpoint[i] = data['thermostat_temp']
+        self._active[i] = data['active']
+        self._next = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _indexes(self) -> range:
+        """Return ring positions from oldest to newest reading"""
+        start = self._next - self.count
+        return range(start, start + self.count)
+
+    def rows(self) -> list:
+        """Return (timestamp, room_temp, external_temp, setpoint, active) tuples from oldest to newest"""
+        return [(self._time[i], self._room_temp[i], self._external_temp[i], self._setpoint[i], self._active[i])
+                for i in self._indexes()]
+
+    def _window(self, window, now=None) -> list:
+        """Return ring positions of readings taken within last window seconds, oldest first"""
+        since = (now if now is not None else time.time()) - window
+        indexes = []
+        for i in reversed(self._indexes()):
+            if self._time[i] < since:
+                break
+            indexes.append(i)
+        return indexes[::-1]
+
+    def rate_of_change(self, external=False, window=RATE_WINDOW, now=None):
+        """Return least squares slope of temperature over last window seconds, in degrees per hour"""
+        indexes = self._window(window, now)
+        if len(indexes) < 2:
+            return None
+        temps = self._external_temp if external else self._room_temp
+        origin = self._time[indexes[0]]
+        mean_t = sum(self._time[i] - origin for i in indexes) / len(indexes)
+        mean_v = sum(temps[i] for i in indexes) / len(indexes)
+        covariance = sum((self._time[i] - origin - mean_t) * (temps[i] - mean_v) for i in indexes)
+        variance = sum((self._time[i] - origin - mean_t) ** 2 for i in indexes)
+        return covariance / variance * 3600 if variance else None
+
+    def duty_cycle(self, window=DUTY_CYCLE_WINDOW, now=None):
+        """Return share of last window seconds the thermostat was heating"""
+        indexes = self._window(window, now)
+        if len(indexes) < 2:
+            return None
+        heating = sum(self._time[i + 1] - self._time[i] for i in indexes[:-1] if self._active[i])
+        span = self._time[indexes[-1]] - self._time[indexes[0]]
+        return heating / span if span else None
+
+    def heating_since(self):
+        """Return timestamp of first reading of current heating run, None if not heating"""
+        since = None
+        for i in reversed(self._indexes()):
+            if not self._active[i]:
+                break
+            since = self._time[i]
+        return since
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import socket
+
+import broadlink
+from broadlink.exceptions import AuthenticationError, DeviceOfflineError, check_error
+
+_LOGGER = logging.getLogger(__name__)
+
+# Resend request if device did not answer within this time, same as broadlink does
+RESEND_INTERVAL = 1
+
+_TRANSPORTS = {}
+
+
+async def async_get_transport():
+    """Get UDP transport shared by all thermostats on the running loop"""
+    loop = asyncio.get_event_loop()
+    if loop not in _TRANSPORTS:
+        _TRANSPORTS[loop] = asyncio.ensure_future(
+            loop.create_datagram_endpoint(ThermostatProtocol, local_addr=('0.0.0.0', 0), family=socket.AF_INET))
+    try:
+        _, protocol = await asyncio.shield(_TRANSPORTS[loop])
+    except OSError:
+        _TRANSPORTS.pop(loop, None)
+        raise
+    return protocol
+
+
+class ThermostatProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self):
+        self._transport = None
+        self._pending = {}
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+
+    def connection_lost(self, exc) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(DeviceOfflineError("Transport closed"))
+        self._pending.clear()
+
+    def error_received(self, exc) -> None:
+        _LOGGER.debug("Thermostat transport error: %s", str(exc))
+
+    def datagram_received(self, data, addr) -> None:
+        """Match reply to request by device address, port and packet count"""
+        if len(data) < 0x38:
+            return
+
+        future = self._pending.pop((addr[:2], data[0x28] | data[0x29] << 8), None)
+        if future is not None and not future.done():
+            future.set_result(bytearray(data))
+
+    @property
+    def pending(self) -> int:
+        """Return number of requests in flight"""
+        return len(self._pending)
+
+    async def async_request(self, host, count, packet, timeout) -> bytearray:
+        """Send packet and wait for reply with the same count, resending until timeout"""
+        loop = asyncio.get_event_loop()
+        key = (tuple(host[:2]), count)
+        if key in self._pending:
+            # Reply could not be told apart, fail instead of stealing reply of the other request
+            raise ValueError("Request {0} to {1}:{2} is already in flight".format(count, *key[0]))
+        future = self._pending[key] = loop.create_future()
+        deadline = loop.time() + timeout
+
+        try:
+            while True:
+                self._transport.sendto(packet, host)
+                remaining = deadline - loop.time()
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), min(RESEND_INTERVAL, remaining))
+                except asyncio.TimeoutError:
+                    if loop.time() >= deadline:
+                        raise DeviceOfflineError("The device is offline")
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+
+class _Exchange:
+    """Stand-in for hysen device, captures request payload and returns given response"""
+
+    def __init__(self, response=None):
+        self.request = None
+        self.response = response if response is not None else bytearray(0x40)
+
+    def send_request(self, input_payload):
+        self.request = input_payload
+        return self.response
+
+
+class HysenDevice(broadlink.hysen):
+
+    def __init__(self, host, mac, timeout):
+        broadlink.hysen.__init__(self, host, mac, 0x4EAD, timeout)
+
+    def get_status(self):
+        """Get status without time and schedule, see broadlink.hysen.get_full_status"""
+        payload = self.send_request(bytearray([0x01, 0x03, 0x00, 0x00, 0x00, 0x08]))
+        data = {}
+        data['remote_lock'] = payload[3] & 1
+        data['power'] = payload[4] & 1
+        data['active'] = (payload[4] >> 4) & 1
+        data['temp_manual'] = (payload[4] >> 6) & 1
+        data['room_temp'] = (payload[5] & 255) / 2.0
+        data['thermostat_temp'] = (payload[6] & 255) / 2.0
+        data['auto_mode'] = payload[7] & 15
+        data['loop_mode'] = (payload[7] >> 4) & 15
+        data['sensor'] = payload[8]
+        data['osv'] = payload[9]
+        data['dif'] = payload[10]
+        data['svh'] = payload[11]
+        data['svl'] = payload[12]
+        data['room_temp_adj'] = ((payload[13] << 8) + payload[14]) / 2.0
+        if data['room_temp_adj'] > 32767:
+            data['room_temp_adj'] = 32767 - data['room_temp_adj']
+        data['fre'] = payload[15]
+        data['poweron'] = payload[16]
+        data['unknown'] = payload[17]
+        data['external_temp'] = (payload[18] & 255) / 2.0
+        return data
+
+
+class AsyncHysenDevice(HysenDevice):
+
+    def __init__(self, transport, host, mac, timeout):
+        HysenDevice.__init__(self, host, mac, timeout)
+        self._transport = transport
+
+    def _packet(self, command, payload) -> bytearray:
+        """Build encrypted packet, see broadlink.device.send_packet"""
+        self.count = (self.count + 1) & 0xffff
+        packet = bytearray(0x38)
+        packet[0x00:0x08] = b'\x5a\xa5\xaa\x55\x5a\xa5\xaa\x55'
+        packet[0x24] = self.devtype & 0xff
+        packet[0x25] = self.devtype >> 8
+        packet[0x26] = command
+        packet[0x28] = self.count & 0xff
+        packet[0x29] = self.count >> 8
+        packet[0x2a:0x30] = self.mac[0:6]
+        packet[0x30:0x34] = self.id[0:4]
+
+        # pad the payload for AES encryption
+        if payload:
+            payload += bytearray((16 - len(payload)) % 16)
+
+        checksum = 0xbeaf
+        for b in payload:
+            checksum = (checksum + b) & 0xffff
+        packet[0x34] = checksum & 0xff
+        packet[0x35] = checksum >> 8
+
+        packet.extend(self.encrypt(bytes(payload)))
+
+        checksum = 0xbeaf
+        for b in packet:
+            checksum = (checksum + b) & 0xffff
+        packet[0x20] = checksum & 0xff
+        packet[0x21] = checksum >> 8
+
+        return packet
+
+    async def async_send_packet(self, command, payload) -> bytearray:
+        """Send packet over shared transport"""
+        packet = self._packet(command, payload)
+        return await self._transport.async_request(self.host, self.count, packet, self.timeout)
+
+    async def async_auth(self) -> bool:
+        """Exchange session key, see broadlink.device.auth"""
+        payload = bytearray(0x50)
+        payload[0x04:0x13] = b'1' * 15
+        payload[0x1e] = 0x01
+        payload[0x2d] = 0x01
+        payload[0x30:0x37] = b'Test  1'
+
+        response = await self.async_send_packet(0x65, payload)
+        check_error(response[0x22:0x24])
+        payload = self.decrypt(bytes(response[0x38:]))
+
+        key = payload[0x04:0x14]
+        if len(key) % 16 != 0:
+            raise AuthenticationError("Authentication failed")
+
+        self.id = payload[0x00:0x04]
+        self.update_aes(key)
+        return True
+
+    async def async_send_request(self, input_payload) -> bytearray:
+        """Send hysen request, see broadlink.hysen.send_request"""
+        crc = self.calculate_crc16(bytes(input_payload))
+
+        # first byte is length, +2 for CRC16
+        request_payload = bytearray([len(input_payload) + 2, 0x00])
+        request_payload.extend(input_payload)
+        request_payload.append(crc & 0xFF)
+        request_payload.append((crc >> 8) & 0xFF)
+
+        response = await self.async_send_packet(0x6a, request_payload)
+        check_error(response[0x22:0x24])
+        response_payload = bytearray(self.decrypt(bytes(response[0x38:])))
+
+        response_payload_len = response_payload[0]
+        if response_payload_len + 2 > len(response_payload):
+            raise ValueError('hysen_response_error', 'first byte of response is not length')
+        crc = self.calculate_crc16(bytes(response_payload[2:response_payload_len]))
+        if (response_payload[response_payload_len] == crc & 0xFF) and (
+                response_payload[response_payload_len + 1] == (crc >> 8) & 0xFF):
+            return response_payload[2:response_payload_len]
+        raise ValueError('hysen_response_error', 'CRC check on response failed')
+
+    async def async_call(self, method, *args):
+        """Run HysenDevice method by name over shared transport"""
+        method = getattr(HysenDevice, method)
+        request = _Exchange()
+        method(request, *args)
+        response = await self.async_send_request(request.request)
+        return method(_Exchange(response), *args)
@@ -1,30 +1,90 @@
 import logging
-import re
 import sys
-import socketserver
-import threading
 import asyncio
 import datetime
+from collections import deque
+from functools import partial
+
+import voluptuous as vol
+
+from custom_components.secolink.journal import EventJournal
+from custom_components.secolink.listener import DOMAIN, async_get_listener
+from custom_components.secolink.protocol import (
+    ARM_AWAY,
+    ARM_HOME,
+    ARM_NIGHT,
+    DISARM,
+    TRIGGER
+)
 
 import homeassistant.components.alarm_control_panel as alarm
 from homeassistant.components.alarm_control_panel.const import (
-    SUPPORT_ALARM_ARM_AWAY, SUPPORT_ALARM_ARM_HOME, SUPPORT_ALARM_ARM_NIGHT
+    SUPPORT_ALARM_ARM_AWAY, SUPPORT_ALARM_ARM_HOME
 )
+from homeassistant.core import callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_call_later
 from homeassistant.const import (     
+    ATTR_ENTITY_ID,
     STATE_ALARM_ARMED_AWAY, STATE_ALARM_ARMED_HOME, STATE_ALARM_ARMED_NIGHT,
     STATE_ALARM_DISARMED, STATE_ALARM_TRIGGERED, STATE_UNKNOWN)
 
 _LOGGER = logging.getLogger(__name__)
 
-QUAL_OPEN = 1
-QUAL_CLOSE = 3
-
-
-def setup_platform(hass, config, add_devices, discovery_info=None):
-    add_devices([SecolinkAlarm(
+TRANSITION_STATES = {
+    TRIGGER: STATE_ALARM_TRIGGERED,
+    DISARM: STATE_ALARM_DISARMED,
+    ARM_AWAY: STATE_ALARM_ARMED_AWAY,
+    ARM_HOME: STATE_ALARM_ARMED_HOME,
+    ARM_NIGHT: STATE_ALARM_ARMED_NIGHT,
+}
+
+# Events received within this many seconds are written as one state update
+DEFAULT_COALESCE_WINDOW = 0.5
+EVENT_SECOLINK_EVENTS = 'secolink_events'
+# Newest events of last window kept in state attributes, full batch is only in secolink_events
+LAST_EVENTS = 5
+
+# Events kept in memory for recent_events
+RECENT_EVENTS = 200
+# Events replayed from journal on startup to refill recent events, heartbeats are not counted
+JOURNAL_REPLAY = RECENT_EVENTS
+
+SERVICE_RECENT_EVENTS = 'recent_events'
+EVENT_SECOLINK_RECENT_EVENTS = 'secolink_recent_events'
+ATTR_COUNT = 'count'
+ATTR_CATEGORY = 'category'
+
+RECENT_EVENTS_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Optional(ATTR_COUNT): vol.All(vol.Coerce(int), vol.Range(min=1, max=RECENT_EVENTS)),
+    vol.Optional(ATTR_CATEGORY): cv.string,
+})
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    async_add_entities([SecolinkAlarm(
         hass, config
     )])
 
+    if not hass.services.has_service(DOMAIN, SERVICE_RECENT_EVENTS):
+        hass.services.async_register(DOMAIN, SERVICE_RECENT_EVENTS, partial(async_recent_events, hass),
+                                     schema=RECENT_EVENTS_SCHEMA)
+
+
+async def async_recent_events(hass, call) -> None:
+    """Fire event with recent events of given panels (all by default), newest first."""
+    entity_ids = call.data.get(ATTR_ENTITY_ID)
+    for listener in hass.data.get(DOMAIN, {}).values():
+        for panel in list(listener.panels.values()):
+            if entity_ids is not None and panel.entity_id not in entity_ids:
+                continue
+            hass.bus.async_fire(EVENT_SECOLINK_RECENT_EVENTS, {
+                'entity_id': panel.entity_id,
+                'clientid': panel.clientid,
+                'events': panel.recent_events(call.data.get(ATTR_COUNT), call.data.get(ATTR_CATEGORY))
+            })
+
 
 class SecolinkAlarm(alarm.AlarmControlPanel):
 
@@ -35,35 +95,76 @@ class SecolinkAlarm(alarm.AlarmControlPanel):
         self._clientid = str(config.get('clientid', '0000'))
         self._listen_ip = str(config.get('listen_ip', '0.0.0.0'))
         self._listen_port = int(config.get('listen_port', 8125))
+        self._coalesce_window = float(config.get('coalesce_window', DEFAULT_COALESCE_WINDOW))
+        self._journal = None
+        if config.get('journal', True):
+            # Client ID is unique per listener only
+            self._journal = EventJournal(hass.config.path(DOMAIN, '{0}_{1}_{2}.jsonl'.format(
+                self._listen_ip, self._listen_port, self._clientid)))
 
         self._last_heartbeat = None
         self._last_event_at = None
         self._last_event_type = None
+        self._last_event_name = None
+        self._last_event_category = None
         self._last_event_zone = None
         self._last_event_area = None
         self._last_event_qual = None
         self._changed_by = None
         self._state = STATE_UNKNOWN
 
-        server = ThreadedTCPServer((self._listen_ip, self._listen_port), ThreadedTCPRequestHandler)
-        server.secolink = self
-
-        # Start a thread with the server -- that thread will then start one
-        # more thread for each request
-        server_thread = threading.Thread(target=server.serve_forever)
-
-        # Exit the server thread when the main thread terminates
-        server_thread.daemon = True
-        server_thread.start()
+        self._listener = None
+        self._registered = False
+        self._burst = []
+        self._last_events = []
+        self._recent = deque(maxlen=RECENT_EVENTS)
+        self._unsub_flush = None
+
+    async def async_added_to_hass(self):
+        """Rebuild state from journal and start receiving panel reports on listener shared with other panels."""
+        if self._journal is not None:
+            records = await self.hass.async_add_executor_job(
+                self._journal.read_tail, JOURNAL_REPLAY, lambda record: not record['heartbeat'])
+            for record in records:
+                self._apply_record(record)
+            # Last arming change may be older than replayed events
+            checkpoint = await self.hass.async_add_executor_job(self._journal.read_checkpoint)
+            if checkpoint is not None:
+                self._state = checkpoint['state']
+                self._changed_by = checkpoint['changed_by']
+            _LOGGER.debug("Replayed {0} journal records of {1}".format(len(records), self._name))
+        self._listener = await async_get_listener(self.hass, self._listen_ip, self._listen_port)
+        # Client ID taken by another panel on the same listener, this one never receives reports
+        self._registered = self._listener.register(self._clientid, self)
+
+    async def async_will_remove_from_hass(self):
+        """Stop receiving panel reports."""
+        if self._listener is not None:
+            await self._listener.async_unregister(self._clientid, self)
+            self._listener = None
+        if self._unsub_flush is not None:
+            # Write and fire events of the last window instead of dropping them
+            self._unsub_flush()
+            self._flush()
+        if self._journal is not None:
+            await self._journal.async_close()
 
     @property
     def should_poll(self):
         return False
 
+    @property
+    def available(self):
+        return self._registered
+
     @property
     def name(self):
         return self._name
 
+    @property
+    def clientid(self):
+        return self._clientid
+
     @property
     def state(self):
         return self._state
@@ -78,7 +179,7 @@ class SecolinkAlarm(alarm.AlarmControlPanel):
 
     @property
     def supported_features(self):
-        return SUPPORT_ALARM_ARM_AWAY | SUPPORT_ALARM_ARM_HOME | SUPPORT_ALARM_ARM_NIGHT
+        return SUPPORT_ALARM_ARM_AWAY | SUPPORT_ALARM_ARM_HOME
 
     @property
     def device_state_attributes(self):
@@ -87,13 +188,26 @@ class SecolinkAlarm(alarm.AlarmControlPanel):
 
         state_attr['last_heartbeat'] = self._last_heartbeat
         state_attr['last_event_type'] = self._last_event_type
+        state_attr['last_event_name'] = self._last_event_name
+        state_attr['last_event_category'] = self._last_event_category
         state_attr['last_event_zone'] = self._last_event_zone
         state_attr['last_event_area'] = self._last_event_area
         state_attr['last_event_qual'] = self._last_event_qual
         state_attr['last_event_at'] = self._last_event_at
+        state_attr['last_events'] = self._last_events
 
         return state_attr
 
+    def recent_events(self, count=None, category=None) -> list:
+        """Return up to count most recent events, newest first, optionally of one category only."""
+        events = []
+        for record in reversed(self._recent):
+            if count is not None and len(events) >= count:
+                break
+            if category is None or record['category'] == category:
+                events.append(record)
+        return events
+
     @asyncio.coroutine
     def async_alarm_disarm(self, code=None):
         """Send disarm command."""
@@ -118,95 +232,91 @@ class SecolinkAlarm(alarm.AlarmControlPanel):
             _LOGGER.debug("alarm_arm_home: sending %s3", str(code))
             pass
 
-
-class ThreadedTCPRequestHandler(socketserver.BaseRequestHandler):
-
-    def handle(self):
+    @callback
+    def _schedule_flush(self):
+        """Write state once per coalesce window."""
+        if self._coalesce_window <= 0:
+            self._flush()
+        elif self._unsub_flush is None:
+            self._unsub_flush = async_call_later(self.hass, self._coalesce_window, self._flush)
+
+    @callback
+    def _flush(self, now=None):
+        """Write state with all events received since last write and fire them as one batch."""
+        self._unsub_flush = None
+        burst, self._burst = self._burst, []
+        self._last_events = burst[-LAST_EVENTS:]
+        if burst:
+            self.hass.bus.async_fire(EVENT_SECOLINK_EVENTS, {
+                'entity_id': self.entity_id,
+                'clientid': self._clientid,
+                'events': burst
+            })
+        self.async_write_ha_state()
+
+    def _apply_record(self, record):
+        """Update state with received or replayed event."""
+        state = TRANSITION_STATES.get(record['transition'])
+        if state is not None:
+            self._state = state
+            self._changed_by = record['zone']
+
+        if record['heartbeat']:
+            self._last_heartbeat = datetime.datetime.fromisoformat(record['at'])
+            return
+
+        self._recent.append(record)
+        self._last_event_at = datetime.datetime.fromisoformat(record['at'])
+        self._last_event_type = record['type']
+        self._last_event_name = record['name']
+        self._last_event_category = record['category']
+        self._last_event_area = record['area']
+        self._last_event_zone = record['zone']
+        self._last_event_qual = record['qualifier']
+
+    def handle_event(self, event, client_address):
+        """Apply Contact ID report to state, return True if it should be acknowledged."""
         try:
-            data = self.request.recv(32).strip()
-            if not data:
-                return
-
-            data = data.decode('utf-8')
-            match = re.match('^(.*?),(.*?),(\d{4}),18(\d)(\d{3})([A-F0-9]{2})(\d{3})$', data)
-            if not match:
-                _LOGGER.warning("Received unknown message from {0}: {1}".format(self.client_address[0], data))
-                return
-
-            event_username = match.group(1)
-            event_password = match.group(2)
-            event_clientid = match.group(3)
-
-            if not event_username == self.server.secolink._username:
-                _LOGGER.warning("Wrong username '{0}' from {1}".format(event_username, self.client_address[0]))
-                return
+            if not event.username == self._username:
+                _LOGGER.warning("Wrong username '{0}' from {1}".format(event.username, client_address))
+                return False
 
-            if not event_password == self.server.secolink._password:
-                _LOGGER.warning("Wrong password '{0}' from {1}".format(event_password, self.client_address[0]))
-                return
-
-            if not event_clientid == self.server.secolink._clientid:
-                _LOGGER.warning("Wrong Client ID '{0}' from {1}".format(event_clientid, self.client_address[0]))
-                return
-
-            self.request.send('ACK'.encode('utf-8'))
-
-            event_qual = match.group(4)
-            event_type = match.group(5)
-            event_area = match.group(6)
-            event_zone = match.group(7)
+            if not event.password == self._password:
+                _LOGGER.warning("Wrong password '{0}' from {1}".format(event.password, client_address))
+                return False
 
             _LOGGER.debug("Received event from {0}. Type: {1}, Area {2}, Zone {3}, Qualifier {4}".format(
-                self.client_address[0], event_type, event_area, event_zone, event_qual))
-
-            event_type = int(event_type)
-            event_qual = int(event_qual)
-
-            is_heartbeat = False
-            if 100 <= event_type < 200:  # ALARMS
-                self.server.secolink._state = STATE_ALARM_TRIGGERED
-                self.server.secolink._changed_by = event_zone
-            elif 400 <= event_type < 410:  # ARM / DISARM
-                if event_qual == QUAL_OPEN:
-                    self.server.secolink._state = STATE_ALARM_DISARMED
-                    self.server.secolink._changed_by = event_zone
-                elif event_qual == QUAL_CLOSE:
-                    self.server.secolink._state = STATE_ALARM_ARMED_AWAY
-                    self.server.secolink._changed_by = event_zone
-            elif event_type == 441 and re.match(r'1\d\d', event_zone):  # STAY
-                if event_qual == QUAL_OPEN:
-                    self.server.secolink._state = STATE_ALARM_DISARMED
-                    self.server.secolink._changed_by = event_zone
-                elif event_qual == QUAL_CLOSE:
-                    self.server.secolink._state = STATE_ALARM_ARMED_HOME
-                    self.server.secolink._changed_by = event_zone
-            elif event_type == 441 and re.match(r'2\d\d', event_zone):  # NIGHT
-                if event_qual == QUAL_OPEN:
-                    self.server.secolink._state = STATE_ALARM_DISARMED
-                    self.server.secolink._changed_by = event_zone
-                elif event_qual == QUAL_CLOSE:
-                    self.server.secolink._state = STATE_ALARM_ARMED_NIGHT
-                    self.server.secolink._changed_by = event_zone
-            elif event_type == 602:  # HEARTBEAT
-                self.server.secolink._last_heartbeat = datetime.datetime.now()
-                is_heartbeat = True
-
-            if is_heartbeat is not True:
-                self.server.secolink._last_event_at = datetime.datetime.now()
-                self.server.secolink._last_event_type = event_type
-                self.server.secolink._last_event_area = event_area
-                self.server.secolink._last_event_zone = event_zone
-                self.server.secolink._last_event_qual = event_qual
-
-            self.server.secolink.async_schedule_update_ha_state()
+                client_address, event.event, event.area, event.zone, event.qualifier))
+
+            record = {
+                'type': int(event.event),
+                'name': event.name,
+                'category': event.category,
+                'qualifier': int(event.qualifier),
+                'area': event.area,
+                'zone': event.zone,
+                'transition': event.transition,
+                'heartbeat': event.is_heartbeat,
+                'at': datetime.datetime.now().isoformat()
+            }
+            self._apply_record(record)
+            if self._journal is not None:
+                self._journal.append(record)
+                if record['transition'] in TRANSITION_STATES:
+                    self._journal.checkpoint({
+                        'state': self._state,
+                        'changed_by': self._changed_by,
+                        'at': record['at']
+                    })
+            if not record['heartbeat']:
+                self._burst.append(record)
+
+            self._schedule_flush()
+            return True
 
         except Exception as ex:
             exc_type, exc_obj, exc_tb = sys.exc_info()
-            _LOGGER.error("Error parsing CSV IP message from {0}".format(self.client_address[0]))
+            _LOGGER.error("Error parsing CSV IP message from {0}".format(client_address))
             _LOGGER.error("Error: {0}".format(str(ex)))
             _LOGGER.error("Line: {0}".format(exc_tb.tb_lineno))
-
-
-class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    daemon_threads = True
-    allow_reuse_address = True
+            return False
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+# Rotate journal when it grows past this size, keeping this many rotated files
+JOURNAL_MAX_BYTES = 1024 * 1024
+JOURNAL_BACKUPS = 2
+# Records appended within this many seconds are written and fsynced together
+JOURNAL_FLUSH_DELAY = 1.0
+
+
+class EventJournal:
+    """Append-only JSON lines journal of panel events, with a checkpoint of the latest state.
+
+    Records are buffered in memory and written with a single write and fsync
+    per flush, in executor so the event loop never waits for the disk. Each
+    flush waits for the previous one, so records reach the file in order.
+    """
+
+    def __init__(self, path, max_bytes=JOURNAL_MAX_BYTES, backups=JOURNAL_BACKUPS, flush_delay=JOURNAL_FLUSH_DELAY):
+        self.path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._flush_delay = flush_delay
+        self._pending = []
+        self._checkpoint = None
+        self._flush_handle = None
+        self._flushing = None
+        self._lock = threading.Lock()
+
+    def append(self, record) -> None:
+        """Buffer record, it is written within flush delay"""
+        self._pending.append(json.dumps(record, sort_keys=True))
+        self._schedule_flush()
+
+    def checkpoint(self, state) -> None:
+        """Replace saved state, written together with records appended before it"""
+        self._checkpoint = state
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(self._flush_delay, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        lines, self._pending = self._pending, []
+        checkpoint, self._checkpoint = self._checkpoint, None
+        if lines or checkpoint is not None:
+            self._flushing = asyncio.ensure_future(self._async_write(self._flushing, lines, checkpoint))
+
+    async def _async_write(self, previous, lines, checkpoint) -> None:
+        if previous is not None:
+            await previous
+        await asyncio.get_event_loop().run_in_executor(None, self.write, lines, checkpoint)
+
+    async def async_close(self) -> None:
+        """Write buffered records"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush()
+        if self._flushing is not None:
+            await self._flushing
+
+    def write(self, lines, checkpoint=None) -> None:
+        """Append lines, fsync and rotate if needed, then replace checkpoint"""
+        with self._lock:
+            self._write(lines, checkpoint)
+
+    def _write(self, lines, checkpoint) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if lines:
+                with open(self.path, 'a', encoding='utf-8') as journal:
+                    journal.write(''.join(line + '\n' for line in lines))
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                    size = journal.tell()
+                if size >= self._max_bytes:
+                    self._rotate()
+            if checkpoint is not None:
+                temp = self.path + '.checkpoint.tmp'
+                with open(temp, 'w', encoding='utf-8') as state:
+                    json.dump(checkpoint, state, sort_keys=True)
+                    state.flush()
+                    os.fsync(state.fileno())
+                os.replace(temp, self.path + '.checkpoint')
+        except OSError as ex:
+            _LOGGER.error("Unable to write journal {0}: {1}".format(self.path, str(ex)))
+
+    def _rotate(self) -> None:
+        for index in range(self._backups, 0, -1):
+            source = '{0}.{1}'.format(self.path, index - 1) if index > 1 else self.path
+            if os.path.exists(source):
+                os.replace(source, '{0}.{1}'.format(self.path, index))
+
+    def read_checkpoint(self):
+        """Return last saved state, None if there is none"""
+        try:
+            with open(self.path + '.checkpoint', encoding='utf-8') as state:
+                return json.load(state)
+        except (OSError, ValueError):
+            return None
+
+    def read_tail(self, count, counted=None) -> list:
+        """Return records back to the count-th one accepted by counted (all by default), oldest first"""
+        with self._lock:
+            return self._read_tail(count, counted)
+
+    def _read_tail(self, count, counted) -> list:
+        records = []
+        found = 0
+        for index in range(0, self._backups + 1):
+            path = '{0}.{1}'.format(self.path, index) if index else self.path
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as journal:
+                lines = journal.readlines()
+            for line in reversed(lines):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Partially written last line of crashed run
+                    continue
+                records.append(record)
+                if counted is None or counted(record):
+                    found += 1
+                    if found >= count:
+                        return records[::-1]
+        return records[::-1]
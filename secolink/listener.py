@@ -0,0 +1,115 @@
+import asyncio
+import logging
+
+from custom_components.secolink.protocol import FrameBuffer, decode
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = 'secolink'
+
+READ_SIZE = 1024
+# Close connection after this many seconds without data
+IDLE_TIMEOUT = 300
+
+
+async def async_get_listener(hass, listen_ip, listen_port):
+    """Get listener shared by all panels reporting to the same address"""
+    listeners = hass.data.setdefault(DOMAIN, {})
+    key = (listen_ip, listen_port)
+    if key not in listeners:
+        listeners[key] = SecolinkListener(listen_ip, listen_port)
+    listener = listeners[key]
+    await listener.async_start()
+    return listener
+
+
+class SecolinkListener:
+    """Receive CSV IP reports on one port and route them to panels by account (client ID)"""
+
+    def __init__(self, listen_ip, listen_port):
+        self._listen_ip = listen_ip
+        self._listen_port = listen_port
+        self._panels = {}
+        self._clients = set()
+        self._server = None
+        self._starting = None
+
+    @property
+    def panels(self) -> dict:
+        return self._panels
+
+    def register(self, clientid, panel) -> bool:
+        """Route reports of given account to panel, return False if account is taken"""
+        if clientid in self._panels and self._panels[clientid] is not panel:
+            _LOGGER.error("Client ID {0} is already used by another panel on {1}:{2}".format(
+                clientid, self._listen_ip, self._listen_port))
+            return False
+        self._panels[clientid] = panel
+        return True
+
+    async def async_unregister(self, clientid, panel) -> None:
+        """Stop routing reports to panel, stop listening when no panels are left"""
+        if self._panels.get(clientid) is panel:
+            del self._panels[clientid]
+        if not self._panels:
+            await self.async_stop()
+
+    async def async_start(self) -> None:
+        if self._server is not None:
+            return
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(asyncio.start_server(
+                self._async_handle_client, self._listen_ip, self._listen_port, reuse_address=True))
+        try:
+            self._server = await asyncio.shield(self._starting)
+        finally:
+            self._starting = None
+
+    async def async_stop(self) -> None:
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        server.close()
+        for writer in list(self._clients):
+            writer.close()
+        await server.wait_closed()
+
+    async def _async_handle_client(self, reader, writer):
+        """Read CSV IP reports until panel disconnects, acknowledge each accepted one"""
+        address = writer.get_extra_info('peername')
+        frames = FrameBuffer()
+        self._clients.add(writer)
+        try:
+            while True:
+                data = await asyncio.wait_for(reader.read(READ_SIZE), IDLE_TIMEOUT)
+                if not data:
+                    break
+                for frame in frames.feed(data):
+                    if self._handle_frame(frame, address[0]):
+                        writer.write('ACK'.encode('utf-8'))
+                await writer.drain()
+        except ValueError as ex:
+            _LOGGER.warning("Dropping connection from {0}: {1}".format(address[0], str(ex)))
+        except (asyncio.TimeoutError, ConnectionError) as ex:
+            _LOGGER.debug("Connection from {0} closed: {1}".format(address[0], str(ex)))
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def _handle_frame(self, frame, client_address) -> bool:
+        """Pass report to panel of its account, return True if it should be acknowledged"""
+        try:
+            event = decode(frame)
+        except UnicodeDecodeError:
+            event = None
+        if event is None:
+            _LOGGER.warning("Received unknown message from {0}: {1}".format(
+                client_address, frame.decode('utf-8', 'replace')))
+            return False
+
+        panel = self._panels.get(event.clientid)
+        if panel is None:
+            _LOGGER.warning("Wrong Client ID '{0}' from {1}".format(event.clientid, client_address))
+            return False
+
+        return panel.handle_event(event, client_address)
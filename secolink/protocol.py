@@ -0,0 +1,195 @@
+import re
+from collections import namedtuple
+
+# Frames are separated by any of CR, LF or NUL
+FRAME_DELIMITER = re.compile(b'[\r\n\x00]')
+# Longest frame accepted, anything longer without delimiter is dropped
+MAX_FRAME_SIZE = 256
+
+# username,password,clientid,18<qualifier><event><area><zone>
+MESSAGE_PATTERN = re.compile(r'^(.*?),(.*?),(\d{4}),18(\d)(\d{3})([A-F0-9]{2})(\d{3})$')
+
+
+class FrameBuffer:
+    """Split stream of bytes into CSV IP frames"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data) -> list:
+        """Add received bytes, return complete frames"""
+        self._buffer.extend(data)
+        *frames, rest = FRAME_DELIMITER.split(bytes(self._buffer))
+
+        # Panel may send single report without delimiter and wait for ACK
+        if rest and MESSAGE_PATTERN.match(rest.decode('utf-8', 'replace')):
+            frames.append(rest)
+            rest = b''
+
+        if len(rest) > MAX_FRAME_SIZE:
+            self._buffer = bytearray()
+            raise ValueError("Frame exceeds {0} bytes".format(MAX_FRAME_SIZE))
+
+        self._buffer = bytearray(rest)
+        return [frame.strip() for frame in frames if frame.strip()]
+
+
+QUAL_NEW = 1  # new event or opening (disarm)
+QUAL_RESTORE = 3  # restore or closing (arm)
+QUAL_STATUS = 6  # previously reported, still present
+
+# State transitions, mapped to alarm states by the entity
+TRIGGER = 'trigger'
+DISARM = 'disarm'
+ARM_AWAY = 'arm_away'
+ARM_HOME = 'arm_home'
+ARM_NIGHT = 'arm_night'
+
+CATEGORY_ALARM = 'alarm'
+CATEGORY_SUPERVISORY = 'supervisory'
+CATEGORY_TROUBLE = 'trouble'
+CATEGORY_OPEN_CLOSE = 'open_close'
+CATEGORY_BYPASS = 'bypass'
+CATEGORY_TEST = 'test'
+
+CATEGORIES = {
+    1: CATEGORY_ALARM,
+    2: CATEGORY_SUPERVISORY,
+    3: CATEGORY_TROUBLE,
+    4: CATEGORY_OPEN_CLOSE,
+    5: CATEGORY_BYPASS,
+    6: CATEGORY_TEST,
+}
+
+# Contact ID event codes, SIA DC-05
+EVENT_NAMES = {
+    100: 'Medical', 101: 'Personal emergency', 102: 'Fail to report in',
+    110: 'Fire', 111: 'Smoke', 112: 'Combustion', 113: 'Water flow', 114: 'Heat', 115: 'Pull station',
+    116: 'Duct', 117: 'Flame', 118: 'Near alarm',
+    120: 'Panic', 121: 'Duress', 122: 'Silent panic', 123: 'Audible panic', 124: 'Duress access grant',
+    125: 'Duress egress grant',
+    130: 'Burglary', 131: 'Perimeter', 132: 'Interior', 133: '24 hour', 134: 'Entry/exit', 135: 'Day/night',
+    136: 'Outdoor', 137: 'Tamper', 138: 'Near alarm', 139: 'Intrusion verifier',
+    140: 'General alarm', 141: 'Polling loop open', 142: 'Polling loop short', 143: 'Expansion module failure',
+    144: 'Sensor tamper', 145: 'Expansion module tamper', 146: 'Silent burglary', 147: 'Sensor supervision failure',
+    150: '24 hour non-burglary', 151: 'Gas detected', 152: 'Refrigeration', 153: 'Loss of heat',
+    154: 'Water leakage', 155: 'Foil break', 156: 'Day trouble', 157: 'Low bottled gas level', 158: 'High temp',
+    159: 'Low temp', 161: 'Loss of air flow', 162: 'Carbon monoxide detected', 163: 'Tank level',
+    200: 'Fire supervisory', 201: 'Low water pressure', 202: 'Low CO2', 203: 'Gate valve sensor',
+    204: 'Low water level', 205: 'Pump activated', 206: 'Pump failure',
+    300: 'System trouble', 301: 'AC loss', 302: 'Low system battery', 303: 'RAM checksum bad',
+    304: 'ROM checksum bad', 305: 'System reset', 306: 'Panel programming changed', 307: 'Self-test failure',
+    308: 'System shutdown', 309: 'Battery test failure', 310: 'Ground fault', 311: 'Battery missing/dead',
+    312: 'Power supply overcurrent', 313: 'Engineer reset',
+    320: 'Sounder/relay', 321: 'Bell 1', 322: 'Bell 2', 323: 'Alarm relay', 324: 'Trouble relay',
+    325: 'Reversing relay', 326: 'Notification appliance check 3', 327: 'Notification appliance check 4',
+    330: 'System peripheral trouble', 331: 'Polling loop open', 332: 'Polling loop short',
+    333: 'Expansion module failure', 334: 'Repeater failure', 335: 'Local printer out of paper',
+    336: 'Local printer failure', 337: 'Exp. module DC loss', 338: 'Exp. module low battery',
+    339: 'Exp. module reset', 341: 'Exp. module tamper', 342: 'Exp. module AC loss',
+    343: 'Exp. module self-test fail', 344: 'RF receiver jam detect',
+    350: 'Communication trouble', 351: 'Telco 1 fault', 352: 'Telco 2 fault', 353: 'Long range radio fault',
+    354: 'Failure to communicate event', 355: 'Loss of radio supervision', 356: 'Loss of central polling',
+    357: 'Long range radio VSWR problem',
+    370: 'Protection loop', 371: 'Protection loop open', 372: 'Protection loop short', 373: 'Fire trouble',
+    374: 'Exit error alarm', 375: 'Panic zone trouble', 376: 'Hold-up zone trouble', 377: 'Swinger trouble',
+    378: 'Cross-zone trouble',
+    380: 'Sensor trouble', 381: 'Loss of supervision - RF', 382: 'Loss of supervision - RPM',
+    383: 'Sensor tamper', 384: 'RF low battery', 385: 'Smoke detector high sensitivity',
+    386: 'Smoke detector low sensitivity', 387: 'Intrusion detector high sensitivity',
+    388: 'Intrusion detector low sensitivity', 389: 'Sensor self-test failure', 391: 'Sensor watch trouble',
+    392: 'Drift compensation error', 393: 'Maintenance alert',
+    400: 'Open/close', 401: 'Open/close by user', 402: 'Group open/close', 403: 'Automatic open/close',
+    404: 'Late to open/close', 405: 'Deferred open/close', 406: 'Cancel', 407: 'Remote arm/disarm',
+    408: 'Quick arm', 409: 'Keyswitch open/close',
+    411: 'Callback request made', 412: 'Successful download/access', 413: 'Unsuccessful access',
+    414: 'System shutdown command received', 415: 'Dialer shutdown command received',
+    416: 'Successful upload', 421: 'Access denied', 422: 'Access report by user', 423: 'Forced access',
+    424: 'Egress denied', 425: 'Egress granted', 426: 'Access door propped open',
+    427: 'Access point door status monitor trouble', 428: 'Access point request to exit trouble',
+    429: 'Access program mode entry', 430: 'Access program mode exit', 431: 'Access threat level change',
+    432: 'Access relay/trigger fail', 433: 'Access RTE shunt', 434: 'Access DSM shunt',
+    441: 'Armed stay', 442: 'Keyswitch armed stay',
+    450: 'Exception open/close', 451: 'Early open/close', 452: 'Late open/close', 453: 'Failed to open',
+    454: 'Failed to close', 455: 'Auto-arm failed', 456: 'Partial arm', 457: 'Exit error (user)',
+    458: 'User on premises', 459: 'Recent close', 461: 'Wrong code entry', 462: 'Legal code entry',
+    463: 'Re-arm after alarm', 464: 'Auto-arm time extended', 465: 'Panic alarm reset', 466: 'Service on/off premises',
+    501: 'Access reader disable',
+    520: 'Sounder/relay disable', 521: 'Bell 1 disable', 522: 'Bell 2 disable', 523: 'Alarm relay disable',
+    524: 'Trouble relay disable', 525: 'Reversing relay disable', 526: 'Notification appliance check 3 disable',
+    527: 'Notification appliance check 4 disable',
+    531: 'Module added', 532: 'Module removed',
+    551: 'Dialer disabled', 552: 'Radio transmitter disabled', 553: 'Remote upload/download disabled',
+    570: 'Zone/sensor bypass', 571: 'Fire bypass', 572: '24 hour zone bypass', 573: 'Burglary bypass',
+    574: 'Group bypass', 575: 'Swinger bypass', 576: 'Access zone shunt', 577: 'Access point bypass',
+    601: 'Manual trigger test report', 602: 'Periodic test report', 603: 'Periodic RF transmission',
+    604: 'Fire test', 605: 'Status report to follow', 606: 'Listen-in to follow', 607: 'Walk test mode',
+    608: 'Periodic test - system trouble present', 609: 'Video transmitter active',
+    611: 'Point tested OK', 612: 'Point not tested', 613: 'Intrusion zone walk tested',
+    614: 'Fire zone walk tested', 615: 'Panic zone walk tested', 616: 'Service request',
+    621: 'Event log reset', 622: 'Event log 50% full', 623: 'Event log 90% full', 624: 'Event log overflow',
+    625: 'Time/date reset', 626: 'Time/date inaccurate', 627: 'Program mode entry', 628: 'Program mode exit',
+    629: '32 hour event log marker', 630: 'Schedule change', 631: 'Exception schedule change',
+    632: 'Access schedule change',
+    654: 'System inactivity',
+}
+
+HEARTBEAT_EVENTS = frozenset(['602'])
+
+# Lookup tables keyed by event code digits as received
+_NAMES = {'{0:03d}'.format(event): name for event, name in EVENT_NAMES.items()}
+_CATEGORIES = {str(hundreds): category for hundreds, category in CATEGORIES.items()}
+
+
+def _transitions() -> dict:
+    """Build qualifier + event [+ first zone digit] -> transition table"""
+    table = {}
+    for event in range(100, 200):
+        table['{0}{1}'.format(QUAL_NEW, event)] = TRIGGER
+    for event in range(400, 410):
+        table['{0}{1}'.format(QUAL_NEW, event)] = DISARM
+        table['{0}{1}'.format(QUAL_RESTORE, event)] = ARM_AWAY
+    for event in (441, 442):
+        # Zones 1xx report stay, 2xx night arming
+        for zone_hundreds, armed in (('1', ARM_HOME), ('2', ARM_NIGHT)):
+            table['{0}{1}{2}'.format(QUAL_NEW, event, zone_hundreds)] = DISARM
+            table['{0}{1}{2}'.format(QUAL_RESTORE, event, zone_hundreds)] = armed
+    return table
+
+
+TRANSITIONS = _transitions()
+
+
+class ContactIdEvent(namedtuple('ContactIdEvent', 'username password clientid qualifier event area zone')):
+    """Decoded CSV IP report, all fields as received"""
+
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return _NAMES.get(self.event, 'Unknown')
+
+    @property
+    def category(self):
+        return _CATEGORIES.get(self.event[0])
+
+    @property
+    def is_heartbeat(self) -> bool:
+        return self.event in HEARTBEAT_EVENTS
+
+    @property
+    def transition(self):
+        """Return state transition caused by event, None if it does not change state"""
+        code = self.qualifier + self.event
+        return TRANSITIONS.get(code) or TRANSITIONS.get(code + self.zone[0])
+
+
+def decode(frame):
+    """Decode CSV IP frame, return None if it is not a Contact ID report"""
+    match = MESSAGE_PATTERN.match(frame.decode('utf-8'))
+    if match is None:
+        return None
+    return tuple.__new__(ContactIdEvent, match.groups())